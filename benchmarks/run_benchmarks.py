@@ -0,0 +1,139 @@
+import numpy as np
+import pandas as pd
+import argparse
+import json
+import os
+import sys
+import time
+import tracemalloc
+
+# Benchmarks import the shared helpers and the RSI scan modules directly
+ROOT = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..')
+sys.path.append(os.path.join(ROOT, 'common'))
+sys.path.append(os.path.join(ROOT, 'stocks', 'RSI'))
+from backtest_engine import crossover_backtest
+from indicators import IncrementalEMA
+from panel_metrics import align_to_last_valid, calculate_rsi_panel, calculate_performance_panel, detect_signals
+
+# Function to generate deterministic synthetic candles (a random walk), no network needed
+def synthetic_ohlcv(n_bars, seed=0, start='2020-01-01', freq='1min', volatility=0.001):
+    rng = np.random.default_rng(seed)
+    close = 100 * np.exp(np.cumsum(rng.normal(0, volatility, n_bars)))
+    open_ = np.concatenate(([close[0]], close[:-1]))
+    spread = np.abs(rng.normal(0, volatility, n_bars)) * close
+    return pd.DataFrame({
+        'open': open_,
+        'high': np.maximum(open_, close) + spread,
+        'low': np.minimum(open_, close) - spread,
+        'close': close,
+        'volume': rng.gamma(2.0, 50.0, n_bars),
+    }, index=pd.date_range(start, periods=n_bars, freq=freq, name='timestamp'))
+
+# Function to generate a deterministic synthetic daily price panel (dates x tickers)
+def synthetic_price_panel(n_days=252, n_tickers=500, seed=0):
+    rng = np.random.default_rng(seed)
+    prices = 100 * np.exp(np.cumsum(rng.normal(0.0003, 0.02, (n_days, n_tickers)), axis=0))
+    # A few late listings, like a real index
+    for j in rng.choice(n_tickers, size=max(1, n_tickers // 50), replace=False):
+        prices[:rng.integers(1, n_days // 2), j] = np.nan
+    return pd.DataFrame(prices, index=pd.bdate_range('2024-01-01', periods=n_days),
+                        columns=[f'T{j:04d}' for j in range(n_tickers)])
+
+# Function to time a benchmark: best wall time of `repeat` runs and peak memory of one run
+def measure(func, repeat=3):
+    times = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        func()
+        times.append(time.perf_counter() - start)
+    tracemalloc.start()
+    func()
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return min(times), peak
+
+# Function to list the benchmarks: name -> (function, number of items processed, unit)
+def build_benchmarks(quick=False, panel=None):
+    benchmarks = {}
+
+    sizes = [1_000, 100_000] if quick else [1_000, 100_000, 10_000_000]
+    for n_bars in sizes:
+        close = synthetic_ohlcv(n_bars)['close']
+        benchmarks[f'ema_pandas_{n_bars}'] = (
+            lambda close=close: close.ewm(span=200, adjust=False).mean(), n_bars, 'bars')
+
+        short_ema = close.ewm(span=50, adjust=False).mean().to_numpy()
+        long_ema = close.ewm(span=200, adjust=False).mean().to_numpy()
+        values = close.to_numpy()
+        benchmarks[f'crossover_backtest_{n_bars}'] = (
+            lambda values=values, short_ema=short_ema, long_ema=long_ema: crossover_backtest(values, short_ema, long_ema),
+            n_bars, 'bars')
+
+    updates = synthetic_ohlcv(100_000)['close'].to_numpy()
+
+    def incremental_ema():
+        ema = IncrementalEMA(200)
+        for t, close in enumerate(updates):
+            ema.update(close, t)
+    benchmarks['ema_incremental_100000'] = (incremental_ema, len(updates), 'updates')
+
+    panel = synthetic_price_panel() if panel is None else panel
+    benchmarks['rsi_panel'] = (lambda: calculate_rsi_panel(align_to_last_valid(panel)), panel.shape[1], 'tickers')
+
+    def scan():
+        rsi = calculate_rsi_panel(align_to_last_valid(panel))
+        signals = detect_signals(rsi, {'buy': 51, 'sell': 71})
+        performance_df = calculate_performance_panel(panel)
+        return {name: pd.merge(table, performance_df, on='Ticker', how='left') for name, table in signals.items()}
+    benchmarks['sp500_scan'] = (scan, panel.shape[1], 'tickers')
+
+    return benchmarks
+
+# Function to run the benchmarks and compare them with a saved baseline
+def run(quick=False, panel=None, baseline=None, tolerance=0.2, only=None):
+    results = {}
+    regressions = []
+    previous = {}
+    if baseline and os.path.exists(baseline):
+        with open(baseline) as f:
+            previous = json.load(f)
+
+    print(f"{'benchmark':<32}{'time':>12}{'throughput':>25}{'peak memory':>14}{'vs baseline':>14}")
+    for name, (func, items, unit) in build_benchmarks(quick, panel).items():
+        if only and not any(pattern in name for pattern in only):
+            continue
+        seconds, peak = measure(func, repeat=1 if items >= 10_000_000 else 3)
+        results[name] = {'seconds': seconds, 'items_per_second': items / seconds, 'unit': unit, 'peak_bytes': peak}
+
+        change = ''
+        if name in previous:
+            ratio = seconds / previous[name]['seconds'] - 1
+            change = f"{ratio:+.1%}"
+            if ratio > tolerance:
+                regressions.append(name)
+                change += ' !'
+        print(f"{name:<32}{seconds * 1000:>10.2f}ms{items / seconds:>16,.0f} {unit:<8}{peak / 2**20:>11.1f}MB{change:>14}")
+
+    if regressions:
+        print(f"\nSlower than the baseline by more than {tolerance:.0%}: {', '.join(regressions)}")
+    return results, regressions
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Benchmarks for the indicator, backtest and scan hot paths")
+    parser.add_argument('--quick', action='store_true', help="Skip the 10M bar runs")
+    parser.add_argument('--only', nargs='+', default=None, help="Only run benchmarks whose name contains one of these")
+    parser.add_argument('--panel', default=None, help="CSV of a recorded price panel (dates x tickers) for the scan benchmarks")
+    parser.add_argument('--baseline', default=os.path.join(os.path.dirname(os.path.abspath(__file__)), 'baseline.json'),
+                        help="Baseline file to compare against")
+    parser.add_argument('--save-baseline', action='store_true', help="Save these results as the new baseline")
+    parser.add_argument('--tolerance', type=float, default=0.2, help="Allowed slowdown before flagging a regression")
+    args = parser.parse_args()
+
+    panel = pd.read_csv(args.panel, index_col=0, parse_dates=True) if args.panel else None
+    results, regressions = run(args.quick, panel, args.baseline, args.tolerance, args.only)
+
+    if args.save_baseline:
+        with open(args.baseline, 'w') as f:
+            json.dump(results, f, indent=2)
+        print(f"Baseline saved to {args.baseline}")
+    sys.exit(1 if regressions else 0)
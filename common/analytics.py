@@ -0,0 +1,186 @@
+import numpy as np
+import pandas as pd
+
+from intervals import interval_ms
+
+# Columns performance_metrics reports, in order
+METRIC_COLUMNS = ['Total Return %', 'CAGR %', 'Volatility %', 'Sharpe', 'Sortino', 'Max Drawdown %', 'Calmar',
+                  'Win Rate %', 'Trades', 'Exposure %', 'Turnover']
+
+# Function to get how many bars of an interval make up a year
+def bars_per_year(interval, trading_days=365):
+    """
+    interval: a Binance interval string ('1m', '4h', '1d', '1w', '1M') or a DatetimeIndex
+    to infer it from (median bar spacing). trading_days is 365 for crypto, which trades
+    around the clock; use 252 for stock daily bars. Intraday bars assume 24-hour days.
+    """
+    if isinstance(interval, pd.DatetimeIndex):
+        days = pd.Timedelta(np.median(np.diff(interval.asi8)), unit=interval.unit).total_seconds() / 86400
+    else:
+        days = interval_ms(interval) / 86_400_000
+    # Weekly and monthly bars are calendar lengths; daily and shorter bars count trading days
+    if days >= 7:
+        return 365.25 / days
+    return trading_days / days
+
+# Function to compute period returns, column by column, from one or more equity curves or price series
+def period_returns(values):
+    values = np.asarray(values, dtype=np.float64)
+    return values[1:] / values[:-1] - 1
+
+# Function to get the mean and sample standard deviation of each column over the masked-in values
+def _masked_mean_std(values, mask):
+    if mask.all():
+        # Equity curves have no gaps: plain reductions, no masking copies
+        return values.mean(axis=0), values.std(axis=0, ddof=1) if len(values) > 1 else np.full(values.shape[1:], np.nan)
+    count = mask.sum(axis=0)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        mean = np.where(mask, values, 0.0).sum(axis=0) / count
+        variance = np.square(np.where(mask, values - mean, 0.0)).sum(axis=0) / (count - 1)
+        return mean, np.sqrt(np.where(count > 1, variance, np.nan))
+
+# Function to calculate the annualized Sharpe ratio of each column of returns (NaNs skipped)
+def sharpe_ratio(returns, periods_per_year, risk_free=0.0):
+    """risk_free: annual risk-free rate, spread evenly over the periods."""
+    excess = np.asarray(returns, dtype=np.float64) - risk_free / periods_per_year
+    mean, std = _masked_mean_std(excess, ~np.isnan(excess))
+    with np.errstate(divide='ignore', invalid='ignore'):
+        return mean / std * np.sqrt(periods_per_year)
+
+# Function to calculate the annualized Sortino ratio of each column of returns (NaNs skipped)
+def sortino_ratio(returns, periods_per_year, risk_free=0.0):
+    """
+    Mean excess return over the standard deviation of the negative returns, as the RSI
+    report has always computed it.
+    """
+    excess = np.asarray(returns, dtype=np.float64) - risk_free / periods_per_year
+    mean = _masked_mean_std(excess, ~np.isnan(excess))[0]
+    downside_std = _masked_mean_std(excess, excess < 0)[1]
+    with np.errstate(divide='ignore', invalid='ignore'):
+        return mean / downside_std * np.sqrt(periods_per_year)
+
+# Function to calculate the deepest peak-to-trough fall of each equity curve, in percent
+def max_drawdown(equity):
+    equity = np.asarray(equity, dtype=np.float64)
+    return ((equity / np.maximum.accumulate(equity, axis=0) - 1).min(axis=0)) * 100
+
+# Function to compute every performance metric of one or many equity curves in one pass
+def performance_metrics(equity, periods_per_year, positions=None, turnover=None, risk_free=0.0):
+    """
+    equity: one equity curve (1-D) or many side by side (bars x runs, e.g. every
+    combination of a sweep), all computed together with column-wise NumPy operations.
+    positions: the matching 0/1 (or weight) position held at each bar's close, needed for
+    win rate, trades, exposure and turnover; a trade is one run of bars in the market,
+    won if the equity grew over it. turnover: traded fraction of the account per bar,
+    to use instead of the change in positions (e.g. a rebalanced portfolio).
+    Returns a dict of metric -> value for one curve, or a DataFrame with a row per run.
+    """
+    equity = np.asarray(equity, dtype=np.float64)
+    single = equity.ndim == 1
+    if single:
+        equity = equity[:, None]
+    n_bars, n_runs = equity.shape
+    years = max(n_bars - 1, 1) / periods_per_year
+    # Mean and deviations of the excess returns are shared by volatility, Sharpe and Sortino
+    # (the same numbers sharpe_ratio and sortino_ratio compute on their own)
+    excess = period_returns(equity) - risk_free / periods_per_year
+    mean, std = _masked_mean_std(excess, ~np.isnan(excess))
+    downside_std = _masked_mean_std(excess, excess < 0)[1]
+    annualize = np.sqrt(periods_per_year)
+
+    total_return = equity[-1] / equity[0] - 1
+    with np.errstate(divide='ignore', invalid='ignore'):
+        cagr = np.where(equity[-1] > 0, (equity[-1] / equity[0]) ** (1 / years) - 1, -1.0)
+        drawdown = max_drawdown(equity)
+        metrics = {
+            'Total Return %': total_return * 100,
+            'CAGR %': cagr * 100,
+            'Volatility %': std * annualize * 100,
+            'Sharpe': mean / std * annualize,
+            'Sortino': mean / downside_std * annualize,
+            'Max Drawdown %': drawdown,
+            'Calmar': np.where(drawdown < 0, cagr * 100 / -drawdown, np.nan),
+        }
+
+    nan = np.full(n_runs, np.nan)
+    metrics.update({'Win Rate %': nan, 'Trades': nan, 'Exposure %': nan, 'Turnover': nan})
+    if positions is not None:
+        positions = np.asarray(positions, dtype=np.float64).reshape(n_bars, n_runs)
+        held = positions > 0
+        metrics['Exposure %'] = positions.mean(axis=0) * 100
+
+        # A trade runs from the close it was entered on to the close it was left on (or the last
+        # bar if still open), and is won if the equity grew in between
+        entries = np.zeros_like(held)
+        exits = np.zeros_like(held)
+        entries[0] = held[0]
+        entries[1:] = held[1:] & ~held[:-1]
+        exits[1:] = held[:-1] & ~held[1:]
+        exits[-1] |= held[-1]
+        # Column-major positions, so each column's entries and exits pair up in order
+        flat_equity = equity.T.ravel()
+        entry_at = np.flatnonzero(entries.T)
+        exit_at = np.flatnonzero(exits.T)
+        won = flat_equity[exit_at] > flat_equity[entry_at]
+        trades = entries.sum(axis=0)
+        wins = np.bincount(entry_at // n_bars, weights=won, minlength=n_runs)
+        with np.errstate(divide='ignore', invalid='ignore'):
+            metrics['Win Rate %'] = np.where(trades > 0, wins / trades * 100, np.nan)
+        metrics['Trades'] = trades
+        if turnover is None:
+            turnover = np.abs(np.diff(positions, axis=0, prepend=0.0))
+    if turnover is not None:
+        turnover = np.asarray(turnover, dtype=np.float64).reshape(n_bars, n_runs)
+        metrics['Turnover'] = turnover.sum(axis=0) / years  # Times the account is traded per year
+
+    if single:
+        return {name: float(metrics[name][0]) for name in METRIC_COLUMNS}
+    return pd.DataFrame({name: metrics[name] for name in METRIC_COLUMNS})
+
+# Function to print the metrics of one equity curve in the scripts' usual format
+def print_metrics(metrics):
+    for name in METRIC_COLUMNS:
+        value = metrics[name]
+        if np.isnan(value):
+            print(f"{name}: n/a")
+        else:
+            print(f"{name}: {value:.0f}" if name == 'Trades' else f"{name}: {value:.2f}")
+
+if __name__ == '__main__':
+    import time
+
+    from backtest_engine import crossover_backtest
+
+    assert bars_per_year('1h') == 8760 and bars_per_year('1d', trading_days=252) == 252
+    assert bars_per_year(pd.date_range('2024-01-01', periods=100, freq='4h')) == bars_per_year('4h') == 2190
+
+    # One hourly backtest: the metrics agree with pandas and with the trade log
+    rng = np.random.default_rng(0)
+    n_bars = 24 * 365
+    close = 100 * np.exp(np.cumsum(rng.normal(0, 0.01, n_bars)))
+    series = pd.Series(close)
+    result = crossover_backtest(close, series.ewm(span=7, adjust=False).mean().to_numpy(),
+                                series.ewm(span=25, adjust=False).mean().to_numpy())
+    metrics = performance_metrics(result.equity, bars_per_year('1h'), result.in_position)
+    returns = pd.Series(result.equity).pct_change()
+    assert np.isclose(metrics['Sharpe'], returns.mean() / returns.std() * np.sqrt(8760))
+    assert np.isclose(metrics['Sortino'], returns.mean() / returns[returns < 0].std() * np.sqrt(8760))
+    buys = [price for action, _, price, _ in result.trade_log if action == 'Buy']
+    exits = [price for action, _, price, _ in result.trade_log if action != 'Buy']
+    assert metrics['Trades'] == len(buys)
+    assert np.isclose(metrics['Win Rate %'], np.mean([exit > buy for buy, exit in zip(buys, exits)]) * 100)
+    print_metrics(metrics)
+
+    # Many runs side by side give the same numbers as one at a time
+    runs = [crossover_backtest(close, series.ewm(span=s, adjust=False).mean().to_numpy(),
+                               series.ewm(span=l, adjust=False).mean().to_numpy())
+            for s in range(5, 50, 5) for l in range(60, 300, 20)]
+    equity = np.column_stack([run.equity for run in runs])
+    positions = np.column_stack([run.in_position for run in runs])
+    start = time.perf_counter()
+    table = performance_metrics(equity, bars_per_year('1h'), positions)
+    elapsed = time.perf_counter() - start
+    for k in (0, len(runs) // 2, len(runs) - 1):
+        one = performance_metrics(runs[k].equity, bars_per_year('1h'), runs[k].in_position)
+        assert np.allclose([one[name] for name in METRIC_COLUMNS], table.iloc[k].to_numpy(), equal_nan=True)
+    print(f"Metrics of {len(runs)} runs x {n_bars:,} bars in {elapsed * 1000:.1f}ms")
@@ -0,0 +1,156 @@
+import numpy as np
+from collections import namedtuple
+
+# Result of a crossover backtest: the trade log, the final balance and the bar-by-bar
+# equity curve (cash when flat, position * close when holding)
+BacktestResult = namedtuple('BacktestResult', ['trade_log', 'balance', 'equity', 'in_position'])
+
+# Function to find the bars where the short EMA crosses the long EMA
+def crossover_masks(short_ema, long_ema):
+    short_ema = np.asarray(short_ema, dtype=np.float64)
+    long_ema = np.asarray(long_ema, dtype=np.float64)
+    cross_up = np.zeros(len(short_ema), dtype=bool)
+    cross_down = np.zeros(len(short_ema), dtype=bool)
+    # Same comparisons as the per-bar loop: today vs yesterday for every i >= 1
+    cross_up[1:] = (short_ema[1:] > long_ema[1:]) & (short_ema[:-1] <= long_ema[:-1])
+    cross_down[1:] = (short_ema[1:] < long_ema[1:]) & (short_ema[:-1] >= long_ema[:-1])
+    return cross_up, cross_down
+
+# Function to reduce raw crossover events to the trades an all-in/all-out account takes
+def trade_events(cross_up, cross_down):
+    """
+    Returns the bar indices of the entries and exits actually taken. A buy is only taken
+    when flat and a sell only when holding, so the kept events strictly alternate and
+    start with a buy; repeated signals of the same side (possible when the EMAs touch)
+    are dropped.
+    """
+    events = np.flatnonzero(cross_up | cross_down)
+    sides = np.where(cross_up[events], 1, -1)
+
+    # Drop sells before the first buy, then keep only changes of side
+    first_buy = np.argmax(sides == 1) if np.any(sides == 1) else len(sides)
+    events = events[first_buy:]
+    sides = sides[first_buy:]
+    keep = np.ones(len(sides), dtype=bool)
+    keep[1:] = sides[1:] != sides[:-1]
+    events = events[keep]
+
+    return events[0::2], events[1::2]
+
+# Function to run the all-in/all-out EMA crossover backtest over NumPy arrays
+def crossover_backtest(close, short_ema, long_ema, index=None, initial_balance=1000.0):
+    """
+    Vectorized equivalent of the per-bar loop in EMA-Crypto-Backtest.py. Crossovers,
+    position state and the equity curve are computed in bulk; only the (few) trades are
+    walked in Python so the balance arithmetic matches the loop exactly.
+    """
+    close = np.asarray(close, dtype=np.float64)
+    n = len(close)
+    if index is None:
+        index = np.arange(n)
+
+    cross_up, cross_down = crossover_masks(short_ema, long_ema)
+    buys, sells = trade_events(cross_up, cross_down)
+
+    # State-machine pass over the trades only
+    trade_log = []
+    balance = initial_balance
+    position = 0
+    cash_after = np.empty(len(buys) + len(sells), dtype=np.float64)
+    units_after = np.empty(len(buys) + len(sells), dtype=np.float64)
+    for k, i in enumerate(buys):
+        position = balance / close[i]
+        balance = 0
+        trade_log.append(('Buy', index[i], close[i], position))
+        cash_after[2 * k], units_after[2 * k] = 0.0, position
+        if k < len(sells):
+            j = sells[k]
+            balance = position * close[j]
+            position = 0
+            trade_log.append(('Sell', index[j], close[j], balance))
+            cash_after[2 * k + 1], units_after[2 * k + 1] = balance, 0.0
+
+    # Forward-fill cash and units from each trade to build the equity curve in bulk
+    event_bars = np.empty(len(buys) + len(sells), dtype=np.int64)
+    event_bars[0::2] = buys
+    event_bars[1::2] = sells
+    # Slot 0 holds the starting account so bars before the first trade pick it up
+    cash_after = np.concatenate(([initial_balance], cash_after))
+    units_after = np.concatenate(([0.0], units_after))
+    last_event = np.zeros(n, dtype=np.int64)
+    last_event[event_bars] = np.arange(1, len(event_bars) + 1)
+    last_event = np.maximum.accumulate(last_event)
+    cash = cash_after[last_event]
+    units = units_after[last_event]
+    equity = cash + units * close
+    in_position = units > 0
+
+    # Final portfolio value if position is held
+    if position > 0:
+        balance = position * close[-1]
+        trade_log.append(('Final Sell', index[-1], close[-1], balance))
+
+    return BacktestResult(trade_log, balance, equity, in_position)
+
+# Reference implementation: the original per-bar loop, kept to check the engine against
+def loop_backtest(close, short_ema, long_ema, index=None, initial_balance=1000.0):
+    if index is None:
+        index = np.arange(len(close))
+    balance = initial_balance
+    position = 0
+    trade_log = []
+
+    for i in range(1, len(close)):
+        if short_ema[i] > long_ema[i] and short_ema[i - 1] <= long_ema[i - 1] and position == 0:
+            position = balance / close[i]
+            balance = 0
+            trade_log.append(('Buy', index[i], close[i], position))
+        elif short_ema[i] < long_ema[i] and short_ema[i - 1] >= long_ema[i - 1] and position > 0:
+            balance = position * close[i]
+            position = 0
+            trade_log.append(('Sell', index[i], close[i], balance))
+
+    if position > 0:
+        balance = position * close[-1]
+        trade_log.append(('Final Sell', index[-1], close[-1], balance))
+
+    return trade_log, balance
+
+# Function to check the vectorized engine against the original loop on synthetic prices
+def check_equivalence(n_bars=20000, short_period=50, long_period=200, seed=0):
+    import pandas as pd
+
+    rng = np.random.default_rng(seed)
+    close = pd.Series(100 * np.exp(np.cumsum(rng.normal(0, 0.01, n_bars))))
+    # Round prices so the EMAs touch exactly now and then, exercising repeated signals
+    close = close.round(1)
+    short_ema = close.ewm(span=short_period, adjust=False).mean().to_numpy()
+    long_ema = close.ewm(span=long_period, adjust=False).mean().to_numpy()
+    close = close.to_numpy()
+
+    expected_log, expected_balance = loop_backtest(close, short_ema, long_ema)
+    result = crossover_backtest(close, short_ema, long_ema)
+
+    assert result.trade_log == expected_log, "Trade logs differ"
+    assert result.balance == expected_balance, "Final balances differ"
+    assert np.isclose(result.equity[-1], expected_balance), "Equity curve does not end at the final balance"
+    return len(expected_log)
+
+if __name__ == '__main__':
+    import time
+
+    for seed in range(5):
+        for short_period, long_period in [(50, 200), (1, 7), (7, 25)]:
+            check_equivalence(short_period=short_period, long_period=long_period, seed=seed)
+    print("Vectorized engine matches the per-bar loop")
+
+    n_bars = 10_000_000
+    rng = np.random.default_rng(1)
+    close = 100 * np.exp(np.cumsum(rng.normal(0, 0.001, n_bars)))
+    import pandas as pd
+    start = time.perf_counter()
+    series = pd.Series(close)
+    short_ema = series.ewm(span=50, adjust=False).mean().to_numpy()
+    long_ema = series.ewm(span=200, adjust=False).mean().to_numpy()
+    result = crossover_backtest(close, short_ema, long_ema)
+    print(f"{n_bars:,} bars, {len(result.trade_log)} trades in {time.perf_counter() - start:.2f}s")
@@ -0,0 +1,72 @@
+import threading
+import time
+
+class BalanceLedger:
+    """
+    In-process copy of the account's free balances, keyed by asset. It is loaded once
+    with get_account (weight 20, every asset), then kept up to date from the fills of
+    the bot's own orders (and, optionally, user-data stream balance events), and only
+    reconciled against get_account every `reconcile_every` seconds or after invalidate().
+    """
+
+    def __init__(self, client, reconcile_every=900, quote_asset='USDT'):
+        self.client = client
+        self.reconcile_every = reconcile_every
+        self.quote_asset = quote_asset
+        self.balances = {}
+        self.loaded_at = None
+        self.lock = threading.RLock()
+
+    # Function to load the balances from get_account (or from an account_info already fetched)
+    def refresh(self, account_info=None):
+        account_info = account_info or self.client.get_account()
+        balances = {asset['asset']: float(asset['free']) for asset in account_info['balances']}
+        with self.lock:
+            if self.loaded_at is not None:
+                self._report_drift(balances)
+            self.balances = balances
+            self.loaded_at = time.monotonic()
+
+    # Function to log assets where the ledger had drifted from the exchange
+    def _report_drift(self, balances):
+        for asset in set(self.balances) | set(balances):
+            expected = self.balances.get(asset, 0.0)
+            actual = balances.get(asset, 0.0)
+            if abs(expected - actual) > max(1e-8, 1e-6 * abs(actual)):
+                print(f"Balance ledger corrected {asset}: {expected} -> {actual}")
+
+    def invalidate(self):
+        self.loaded_at = None
+
+    # Function to get the free balance of an asset, reconciling first if the ledger is due
+    def free(self, asset):
+        with self.lock:
+            if self.loaded_at is None or time.monotonic() - self.loaded_at > self.reconcile_every:
+                self.refresh()
+            return self.balances.get(asset, 0.0)
+
+    # Function to apply a filled (or partly filled) market order response to the balances
+    def apply_fill(self, symbol, side, order):
+        executed_qty = float(order.get('executedQty', 0))
+        if not executed_qty:
+            return
+        quote_qty = float(order.get('cummulativeQuoteQty') or sum(
+            float(fill['price']) * float(fill['qty']) for fill in order.get('fills', [])))
+        base_asset = symbol[:-len(self.quote_asset)]
+        sign = 1 if side == 'BUY' else -1
+
+        with self.lock:
+            self.balances[base_asset] = self.balances.get(base_asset, 0.0) + sign * executed_qty
+            self.balances[self.quote_asset] = self.balances.get(self.quote_asset, 0.0) - sign * quote_qty
+            for fill in order.get('fills', []):
+                asset = fill.get('commissionAsset')
+                if asset:
+                    self.balances[asset] = self.balances.get(asset, 0.0) - float(fill['commission'])
+
+    # Function to apply a user-data stream event ('outboundAccountPosition' carries the new balances)
+    def apply_account_update(self, event):
+        if event.get('e') != 'outboundAccountPosition':
+            return
+        with self.lock:
+            for balance in event['B']:
+                self.balances[balance['a']] = float(balance['f'])
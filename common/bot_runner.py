@@ -0,0 +1,128 @@
+import asyncio
+import threading
+
+from balance_ledger import BalanceLedger
+from candle_store import CandleStore
+from ema_bot import SymbolBot
+from kline_stream import MultiKlineStream
+from rate_limit import RateLimitedClient, WeightRateLimiter
+from symbol_rules import SymbolRules
+
+class BalanceAllocator:
+    """
+    Hands out the account's free USDT to the symbols that share it, so the per-symbol
+    max_usdt budgets never add up to more than the account actually holds. Shares are
+    fixed at start-up: each bot then trades its own share, and what it makes or loses
+    stays in its balance rather than going back to a common pool.
+    """
+
+    def __init__(self, free_usdt):
+        self.free_usdt = free_usdt
+        self.allocated = {}
+        self.lock = threading.Lock()
+
+    # Function to reserve up to `amount` USDT for a symbol; returns what was granted
+    def allocate(self, symbol, amount):
+        with self.lock:
+            granted = max(0.0, min(amount, self.free_usdt))
+            self.free_usdt -= granted
+            self.allocated[symbol] = self.allocated.get(symbol, 0.0) + granted
+            return granted
+
+class MultiSymbolRunner:
+    """
+    Runs one SymbolBot per symbol in a single asyncio process: one multiplexed kline
+    stream for all symbols, one rate-limited client shared by every bot, and one
+    BalanceAllocator splitting the account's USDT between them. Each symbol's candles
+    are handled in order by its own worker; different symbols run concurrently.
+    """
+
+    def __init__(self, client, symbols, max_usdt_per_symbol=100, interval='1h', api_key=None, api_secret=None,
+                 notify=None, limiter=None, candle_store=None, state_dir=None, bot_options=None,
+                 max_concurrent_startups=8):
+        if isinstance(client, RateLimitedClient):
+            # Already wrapped (e.g. shared with the rest of the script): keep its limiter for the stream too
+            self.limiter = limiter or client.limiter
+            self.client = client
+        else:
+            self.limiter = limiter or WeightRateLimiter()
+            self.client = RateLimitedClient(client, self.limiter)
+        self.symbols = list(symbols)
+        self.max_usdt_per_symbol = max_usdt_per_symbol
+        self.interval = interval
+        self.api_key = api_key
+        self.api_secret = api_secret
+        self.max_concurrent_startups = max_concurrent_startups
+        self.allocator = None
+        candle_store = candle_store or CandleStore()
+        self.rules = SymbolRules(self.client)  # Exchange info is downloaded once for every symbol
+        self.ledger = BalanceLedger(self.client)  # So is the account; fills keep it up to date
+        self.bots = {
+            symbol: SymbolBot(self.client, symbol, max_usdt=max_usdt_per_symbol, interval=interval, notify=notify,
+                              candle_store=candle_store, state_dir=state_dir, rules=self.rules, ledger=self.ledger,
+                              **(bot_options or {}))
+            for symbol in self.symbols
+        }
+
+    # Function to fetch the account once and start every bot with its share of the USDT
+    async def initialize(self):
+        if all(bot.resumed for bot in self.bots.values()):
+            # Every bot resumes from its checkpoint: the budgets are the checkpointed balances
+            self.allocator = BalanceAllocator(sum(bot.state['balance'] for bot in self.bots.values()))
+            for bot in self.bots.values():
+                bot.resume()
+                self.allocator.allocate(bot.symbol, bot.state['balance'])
+            return
+
+        await asyncio.to_thread(self.ledger.refresh)
+        usdt_balance = self.ledger.free('USDT')
+        # USDT held back by resumed bots is already counted in their checkpointed balances
+        usdt_balance -= sum(bot.state['balance'] for bot in self.bots.values() if bot.resumed)
+        self.allocator = BalanceAllocator(max(0.0, usdt_balance))
+
+        startup_slots = asyncio.Semaphore(self.max_concurrent_startups)
+
+        async def start(bot):
+            async with startup_slots:
+                if bot.resume():
+                    return  # Carry on from the checkpoint; its balance is not in the pool
+                share = self.allocator.allocate(bot.symbol, self.max_usdt_per_symbol)
+                await asyncio.to_thread(bot.initialize, share)
+                await asyncio.to_thread(bot.seed_emas)
+
+        await asyncio.gather(*(start(bot) for bot in self.bots.values()))
+
+    # Function to process one symbol's closed candles in order
+    async def _worker(self, bot, queue):
+        while True:
+            kline = await queue.get()
+            try:
+                await asyncio.to_thread(bot.trade_on_close, kline)
+            except Exception as e:
+                print(f"Error trading {bot.symbol}: {e}")
+            finally:
+                queue.task_done()
+
+    async def run(self, stream=None):
+        """
+        Starts every bot, then dispatches closed candles from the stream (by default the
+        multiplexed Binance kline stream; any async iterator of (symbol, kline) works).
+        """
+        await self.initialize()
+        if stream is None:
+            last_close_times = {symbol: bot.candle_store.last_close_time(symbol, self.interval)
+                                for symbol, bot in self.bots.items()}
+            stream = MultiKlineStream(self.symbols, self.interval, self.api_key, self.api_secret,
+                                      last_close_times=last_close_times, limiter=self.limiter)
+
+        queues = {symbol: asyncio.Queue() for symbol in self.symbols}
+        workers = [asyncio.create_task(self._worker(self.bots[symbol], queues[symbol])) for symbol in self.symbols]
+        try:
+            async for symbol, kline in stream:
+                if symbol in queues:
+                    queues[symbol].put_nowait(kline)
+            # A finite stream (e.g. a replay) ends here: let every queued candle be handled
+            await asyncio.gather(*(queue.join() for queue in queues.values()))
+        finally:
+            for worker in workers:
+                worker.cancel()
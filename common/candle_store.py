@@ -0,0 +1,222 @@
+import numpy as np
+import pandas as pd
+import os
+import time
+from itertools import islice
+from operator import itemgetter
+
+# On-disk record layout: one fixed-size row per candle (the unused 'ignore' field is dropped)
+KLINE_DTYPE = np.dtype([
+    ('timestamp', '<i8'),
+    ('open', '<f8'),
+    ('high', '<f8'),
+    ('low', '<f8'),
+    ('close', '<f8'),
+    ('volume', '<f8'),
+    ('close_time', '<i8'),
+    ('quote_asset_vol', '<f8'),
+    ('number_of_trades', '<i8'),
+    ('taker_buy_base_vol', '<f8'),
+    ('taker_buy_quote_vol', '<f8'),
+])
+
+# Default location of the store; override with the CANDLE_STORE_DIR environment variable
+DEFAULT_STORE_DIR = os.environ.get(
+    'CANDLE_STORE_DIR', os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'data', 'candles'))
+
+# Compact in-memory layout for long multi-symbol histories: float32 prices/volumes (about 7
+# significant digits), int64 times. The store itself always keeps the full-precision rows.
+COMPACT_KLINE_DTYPE = np.dtype([
+    (name, '<i8' if name in ('timestamp', 'close_time') else '<i4' if name == 'number_of_trades' else '<f4')
+    for name in KLINE_DTYPE.names
+])
+
+# Klines parsed per chunk, so a long download never holds more than this many as Python lists
+KLINE_CHUNK_SIZE = 50_000
+
+# Function to convert raw Binance klines (lists of strings/ints) into typed records
+def klines_to_records(klines, dtype=KLINE_DTYPE):
+    """
+    Each field is parsed straight into its typed column (no intermediate object array),
+    and the trailing 'ignore' field is never read.
+    """
+    if not isinstance(klines, (list, tuple)):
+        klines = list(klines)
+    records = np.empty(len(klines), dtype=dtype)
+    for j, name in enumerate(dtype.names):
+        parse = int if dtype[name].kind == 'i' else float
+        records[name] = np.fromiter(map(parse, map(itemgetter(j), klines)), dtype=dtype[name], count=len(klines))
+    return records
+
+# Function to parse any iterable of klines (e.g. a paginated download) into typed record chunks
+def iter_record_chunks(klines, chunk_size=KLINE_CHUNK_SIZE, dtype=KLINE_DTYPE):
+    klines = iter(klines)
+    while True:
+        chunk = list(islice(klines, chunk_size))
+        if not chunk:
+            return
+        yield klines_to_records(chunk, dtype)
+
+# Function to convert typed records into the DataFrame layout fetch_ohlcv has always returned
+def records_to_frame(records, compact=False):
+    """
+    compact=True gives float32 price/volume columns (COMPACT_KLINE_DTYPE), about 40%
+    less memory, for analysis over long histories; orders should use the float64 frame.
+    """
+    dtype = COMPACT_KLINE_DTYPE if compact else KLINE_DTYPE
+    index = pd.DatetimeIndex(pd.to_datetime(records['timestamp'], unit='ms'), name='timestamp')
+    # np.array copies each column exactly once, out of the memory map and into the requested type
+    return pd.DataFrame({name: np.array(records[name], dtype=dtype[name]) for name in dtype.names[1:]},
+                        index=index, copy=False)
+
+class CandleStore:
+    """
+    Append-only candle cache: one binary file of KLINE_DTYPE rows per symbol/interval,
+    read back as a memory map. Only closed candles are stored, so the last row's
+    close_time is where the next sync starts.
+    """
+
+    def __init__(self, root=DEFAULT_STORE_DIR):
+        self.root = root
+        self.complete = set()  # (symbol, interval) whose full history is already stored
+
+    def path(self, symbol, interval):
+        return os.path.join(self.root, symbol, f'{interval}.bin')
+
+    # Function to read every stored candle for a symbol/interval (memory-mapped, no copy)
+    def read(self, symbol, interval):
+        path = self.path(symbol, interval)
+        if not os.path.exists(path) or os.path.getsize(path) == 0:
+            return np.empty(0, dtype=KLINE_DTYPE)
+        return np.memmap(path, dtype=KLINE_DTYPE, mode='r')
+
+    def last_close_time(self, symbol, interval):
+        records = self.read(symbol, interval)
+        return int(records['close_time'][-1]) if len(records) else None
+
+    # Function to add candles to the store, keeping it sorted and free of duplicates
+    def write(self, symbol, interval, records):
+        records = records[np.argsort(records['timestamp'], kind='stable')]
+        existing = self.read(symbol, interval)
+        if len(existing) and len(records) and records['timestamp'][0] <= existing['timestamp'][-1]:
+            # Older or overlapping bars (a backfill): merge and rewrite the file once
+            merged = np.concatenate([np.asarray(existing), records])
+            _, keep = np.unique(merged['timestamp'][::-1], return_index=True)
+            merged = merged[::-1][keep]  # Newer copy of a bar wins
+            del existing
+            self._replace(symbol, interval, merged)
+            return len(merged)
+
+        # Fast path: every bar is newer than the store, so just append the bytes
+        os.makedirs(os.path.dirname(self.path(symbol, interval)), exist_ok=True)
+        with open(self.path(symbol, interval), 'ab') as f:
+            f.write(records.tobytes())
+        return len(existing) + len(records)
+
+    def _replace(self, symbol, interval, records):
+        path = self.path(symbol, interval)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        tmp_path = path + '.tmp'
+        with open(tmp_path, 'wb') as f:
+            f.write(records.tobytes())
+        os.replace(tmp_path, path)
+
+    # Function to split fetched candles into closed ones (stored) and the still-forming one
+    def _store_closed(self, symbol, interval, klines):
+        """
+        klines can be any iterable; it is parsed chunk by chunk into typed records, so only
+        one chunk of Python lists is alive at a time. Returns the number of klines and the
+        forming candle(s).
+        """
+        now_ms = int(time.time() * 1000)
+        closed = []
+        forming = np.empty(0, dtype=KLINE_DTYPE)
+        count = 0
+        for records in iter_record_chunks(klines):
+            count += len(records)
+            is_closed = records['close_time'] < now_ms
+            closed.append(records[is_closed])
+            forming = np.concatenate([forming, records[~is_closed]])
+        # One write for the whole batch: a backfill older than the store is merged only once
+        closed = np.concatenate(closed) if closed else np.empty(0, dtype=KLINE_DTYPE)
+        if len(closed):
+            self.write(symbol, interval, closed)
+        return count, forming
+
+    # Function to fetch only the bars after the last stored candle
+    def sync(self, client, symbol, interval, limit=1000):
+        """
+        Brings the store up to date and returns the still-forming candle(s), which are
+        never stored. An empty store is seeded with the latest `limit` candles.
+        """
+        last_close = self.last_close_time(symbol, interval)
+        if last_close is None:
+            klines = client.get_historical_klines(symbol, interval, limit=limit)
+        else:
+            klines = client.get_historical_klines(symbol, interval, start_str=last_close + 1)
+        return self._store_closed(symbol, interval, klines)[1]
+
+    # Function to fill in history older than the first stored candle
+    def backfill(self, client, symbol, interval, start_ms):
+        records = self.read(symbol, interval)
+        if len(records) and records['timestamp'][0] <= start_ms:
+            return
+        end_str = int(records['timestamp'][0]) - 1 if len(records) else None
+        klines = client.get_historical_klines(symbol, interval, start_str=start_ms, end_str=end_str)
+        self._store_closed(symbol, interval, klines)
+
+    # Drop-in replacement for the scripts' fetch_ohlcv
+    def fetch_ohlcv(self, client, symbol, interval='1h', limit=1000, start_ms=None, end_ms=None, include_open=True,
+                    compact=False):
+        """
+        Returns the last `limit` candles (or the candles from start_ms to end_ms) as the
+        usual timestamp-indexed DataFrame. With a client the store is synced first and
+        the still-forming candle is appended, as the REST call used to return; with
+        client=None the store is read offline. compact=True returns float32 prices and
+        volumes (see records_to_frame).
+        """
+        forming = np.empty(0, dtype=KLINE_DTYPE)
+        if client is not None:
+            if start_ms is not None:
+                self.backfill(client, symbol, interval, start_ms)
+            forming = self.sync(client, symbol, interval, limit=limit)
+            if (start_ms is None and (symbol, interval) not in self.complete
+                    and len(self.read(symbol, interval)) + len(forming) < limit):
+                # Store holds fewer bars than asked for: backfill the missing older ones once
+                klines = client.get_historical_klines(symbol, interval, limit=limit)
+                count, _ = self._store_closed(symbol, interval, klines)
+                if count < limit:
+                    self.complete.add((symbol, interval))  # The exchange has no older bars
+
+        records = self.read(symbol, interval)
+        if start_ms is not None:
+            records = records[records['timestamp'] >= start_ms]
+        if end_ms is not None:
+            records = records[records['timestamp'] <= end_ms]
+        if include_open and end_ms is None and len(forming):
+            records = np.concatenate([np.asarray(records), forming])
+        if start_ms is None and limit is not None:
+            records = records[-limit:]
+        return records_to_frame(records, compact)
+
+if __name__ == '__main__':
+    import tempfile
+
+    # Parse a year of 1m klines (as Binance sends them: strings) into a scratch store and read them back
+    n = 525_600
+    start_ms = 1_600_000_000_000
+    klines = [[start_ms + i * 60_000, f"{100 + i * 1e-4:.8f}", f"{101 + i * 1e-4:.8f}", f"{99 + i * 1e-4:.8f}",
+               f"{100.5 + i * 1e-4:.8f}", "12.34500000", start_ms + i * 60_000 + 59_999, "1234.56780000", 42,
+               "6.10000000", "612.30000000", "0"] for i in range(n)]
+    with tempfile.TemporaryDirectory() as root:
+        store = CandleStore(root)
+        started = time.perf_counter()
+        count, forming = store._store_closed('TESTUSDT', '1m', klines)
+        parsed = time.perf_counter() - started
+        df = store.fetch_ohlcv(None, 'TESTUSDT', '1m', limit=None)
+        compact = store.fetch_ohlcv(None, 'TESTUSDT', '1m', limit=None, compact=True)
+        assert count == len(df) == n and not len(forming)
+        assert df['close'].iloc[-1] == float(f"{100.5 + (n - 1) * 1e-4:.8f}") and df['close_time'].dtype == np.int64
+        assert np.allclose(compact['close'], df['close'], rtol=1e-6)
+        print(f"Parsed {n:,} klines in {parsed:.2f}s ({n / parsed:,.0f}/s); frame "
+              f"{df.memory_usage().sum() / 1e6:.0f}MB, compact {compact.memory_usage().sum() / 1e6:.0f}MB")
@@ -0,0 +1,408 @@
+import json
+import math
+import os
+import time
+
+from candle_store import CandleStore, klines_to_records
+from intervals import INTERVAL_MS
+from balance_ledger import BalanceLedger
+from metrics import registry
+from indicators import IncrementalEMA, feed_closed_candles
+from indicator_bank import bank
+from symbol_rules import SymbolRules, is_filter_rejection
+
+# Function to adjust the quantity to match LOT_SIZE rules
+def adjust_quantity_to_lot_size(quantity, lot_size_filter):
+    step_size = lot_size_filter['stepSize']
+    adjusted_quantity = math.floor(quantity / step_size + 1e-9) * step_size
+    # Cut to 4 decimals without rounding up: a rounded-up sell is more than the account holds
+    return math.floor(adjusted_quantity * 10_000 + 1e-6) / 10_000
+
+# Function to read what a market order actually filled: base quantity, quote value and the commission per asset
+def fill_amounts(order, base_asset, quote_asset='USDT'):
+    """
+    Returns (executed_qty, quote_qty, quote_commission, base_commission). Binance takes
+    the commission from the asset the order receives (the base asset on a BUY, the quote
+    asset on a SELL), or from BNB when BNB fees are on, which charges neither of the two.
+    """
+    executed_qty = float(order.get('executedQty', 0))
+    quote_qty = float(order.get('cummulativeQuoteQty') or sum(
+        float(fill['price']) * float(fill['qty']) for fill in order.get('fills', [])))
+    commissions = {quote_asset: 0.0, base_asset: 0.0}
+    for fill in order.get('fills', []):
+        if fill.get('commissionAsset') in commissions:
+            commissions[fill['commissionAsset']] += float(fill['commission'])
+    return executed_qty, quote_qty, commissions[quote_asset], commissions[base_asset]
+
+class SymbolBot:
+    """
+    The EMA trend-flip bot from EMABot-FINAL.py for a single symbol, with its own state
+    instead of the module-level `state` dict, so one process can run many symbols.
+    """
+
+    def __init__(self, client, symbol, max_usdt=10000, interval='1h', short_period=1, long_period=7,
+                 trend_short_period=7, trend_long_period=25, notify=None, candle_store=None, state_dir=None, rules=None,
+                 ledger=None):
+        self.client = client
+        self.symbol = symbol
+        self.interval = interval
+        self.short_period = short_period
+        self.long_period = long_period
+        self.trend_short_period = trend_short_period
+        self.trend_long_period = trend_long_period
+        self.notify = registry.timed('notify')(notify or (lambda subject, message: None))
+        self.candle_store = candle_store or CandleStore()
+        self.rules = rules or SymbolRules(client)  # Share one instance between bots on the same client
+        self.ledger = ledger or BalanceLedger(client)  # Likewise, one ledger per account
+
+        # State Management for this Coin Instance
+        self.state = {
+            "trend": None,      # Placeholder for the current trend: "bullish" or "bearish"
+            "balance": None,    # Will be fetched dynamically
+            "position": None,   # Will be fetched dynamically
+            "max_usdt": max_usdt,  # Max USDT to spend for this instance
+        }
+
+        # Incremental EMAs, seeded once and then updated per closed candle
+        self.emas = {}
+        self.last_candle_time = None  # close_time of the last candle acted on
+
+        # Checkpoint of the state and EMAs, rewritten on every change so a restart resumes where it stopped
+        self.state_file = os.path.join(state_dir, f'{symbol}_state.json') if state_dir else None
+        self.resumed = self.load_state()
+        for period in (short_period, long_period):
+            self.emas.setdefault(str(period), IncrementalEMA(period))
+
+    # Function to load the last checkpoint; returns True if there was one to resume from
+    def load_state(self):
+        if not self.state_file:
+            return False
+        if not os.path.exists(self.state_file):
+            return False
+        try:
+            with open(self.state_file) as f:
+                checkpoint = json.load(f)
+        except (OSError, ValueError) as e:
+            print(f"Ignoring unreadable checkpoint {self.state_file}: {e}")
+            return False
+        for key in ('trend', 'balance', 'position'):
+            self.state[key] = checkpoint['state'][key]
+        self.emas = {key: IncrementalEMA.restore(snapshot) for key, snapshot in checkpoint['emas'].items()}
+        self.last_candle_time = checkpoint.get('last_candle_time')
+        return self.state['trend'] is not None and self.state['balance'] is not None and self.state['position'] is not None
+
+    # Function to checkpoint the state atomically (write a temp file, then rename it over the old one)
+    def save_state(self):
+        if not self.state_file:
+            return
+        checkpoint = {
+            'symbol': self.symbol,
+            'state': {key: self.state[key] for key in ('trend', 'balance', 'position')},
+            'emas': {key: ema.snapshot() for key, ema in self.emas.items()},
+            'last_candle_time': self.last_candle_time,
+            'saved_at': int(time.time() * 1000),
+        }
+        tmp_path = self.state_file + '.tmp'
+        with open(tmp_path, 'w') as f:
+            json.dump(checkpoint, f)
+        os.replace(tmp_path, self.state_file)
+
+    # Function to carry on from the checkpoint instead of initializing from the exchange
+    def resume(self):
+        """
+        Returns True when the last run left a checkpoint. Its trend, position, balance and
+        EMAs are used as they are, so a restart makes no account call, downloads no
+        candle history and places no initial correction orders.
+        """
+        if self.resumed:
+            print(f"Resumed {self.symbol} from checkpoint: Trend = {self.state['trend']}, Position = {self.state['position']}, Balance = {self.state['balance']}")
+        return self.resumed
+
+    # Function to fetch OHLCV data
+    def fetch_ohlcv(self, limit=1000):
+        with registry.timer('fetch_ohlcv', symbol=self.symbol):
+            return self.candle_store.fetch_ohlcv(self.client, self.symbol, self.interval, limit=limit)
+
+    # Function to fetch LOT_SIZE filter details (cached; no exchange info download per order)
+    def get_lot_size_filter(self):
+        with registry.timer('get_lot_size_filter', symbol=self.symbol):
+            return self.rules.lot_size(self.symbol)
+
+    # Function to get current holdings of the symbol
+    def get_current_holdings(self, account_info=None):
+        """Fetch current holdings of the symbol from the balance ledger, treating amounts below minQty as zero."""
+        try:
+            # Seed the ledger from the caller's account info; otherwise it only calls get_account when due
+            if account_info is not None:
+                self.ledger.refresh(account_info)
+
+            # Free balance of the coin (remove "USDT" from the symbol, e.g., "LINKUSDT" -> "LINK")
+            position = self.ledger.free(self.symbol[:-4])
+            if position == 0:
+                return 0
+
+            # Fetch the LOT_SIZE filter to get the minQty
+            lot_size_filter = self.get_lot_size_filter()
+            if lot_size_filter:
+                min_qty = lot_size_filter['minQty']
+
+                # Treat holdings less than minQty as zero
+                if position < min_qty:
+                    print(f"Held position ({position}) is below the minimum quantity ({min_qty}). Treating it as zero.")
+                    return 0
+
+            return position
+        except Exception as e:
+            print(f"Error fetching holdings for {self.symbol}: {e}")
+            return 0
+
+    # Function to initialize the trend
+    def initialize_trend(self):
+        df = self.fetch_ohlcv()
+        # Both spans come from the shared indicator bank, computed once per symbol and candle
+        short_ema, long_ema = bank.get(self.symbol, self.interval, df, [self.trend_short_period, self.trend_long_period])
+
+        if short_ema[-1] > long_ema[-1]:
+            return "bullish"
+        else:
+            return "bearish"
+
+    def initial_correction(self, trend):
+        """
+        Aligns the bot's position with the current trend at the start.
+        If bullish, ensures the position is held. If bearish, ensures no holdings.
+        """
+        symbol = self.symbol
+        holdings = self.state["position"]
+        if trend == "bullish" and holdings == 0:
+            # Buy assets to align with bullish trend
+            price = float(self.client.get_symbol_ticker(symbol=symbol)['price'])
+            lot_size_filter = self.get_lot_size_filter()
+            # Reserve 1% for fees and slippage, as buy() does, so the order fits in the free balance
+            quantity = adjust_quantity_to_lot_size(self.state['balance'] * 0.99 / price, lot_size_filter)
+            order = self.client.order_market_buy(symbol=symbol, quantity=quantity)
+            self.ledger.apply_fill(symbol, 'BUY', order)
+            executed_qty, quote_qty, commission, base_commission = fill_amounts(order, symbol[:-4])
+            self.state["position"] = executed_qty - base_commission  # What the account received, after fees
+            self.state["balance"] -= quote_qty + commission  # Fully invested: only what the fill left over remains
+            print(f"Initial correction: Bought {quantity} of {symbol}.")
+            self.notify(f"Initial correction: Bought {quantity} of {symbol}", f"Buy executed at {price:.2f}")
+        elif trend == "bearish" and holdings > 0:
+            # Sell all holdings to align with bearish trend
+            order = self.client.order_market_sell(symbol=symbol, quantity=holdings)
+            self.ledger.apply_fill(symbol, 'SELL', order)
+            executed_qty, quote_qty, commission, _ = fill_amounts(order, symbol[:-4])
+            price = quote_qty / executed_qty if executed_qty > 0 else 0.0
+            self.state["position"] = 0
+            self.state["balance"] += quote_qty - commission  # What the sale actually paid, after fees
+            print(f"Initial correction: Sold all holdings of {symbol}.")
+            self.notify(f"Initial correction: Sold all holdings of {symbol}", f"Sell executed at {price:.2f}")
+
+    # Function to fetch the holdings, derive the trend and align the position with it at start-up
+    def initialize(self, usdt_balance, account_info=None):
+        """
+        usdt_balance is the USDT this bot may use: the whole free balance when it runs
+        alone, or its share from a BalanceAllocator when many symbols share an account.
+        """
+        try:
+            self.state["trend"] = self.initialize_trend()
+            self.state["position"] = self.get_current_holdings(account_info)
+            self.state["balance"] = usdt_balance
+            print(f"Initial State {self.symbol}: Trend = {self.state['trend']}, Position = {self.state['position']}, Balance = {self.state['balance']}")
+
+            # Perform initial correction based on the trend
+            self.initial_correction(self.state["trend"])
+            self.save_state()
+        except Exception as e:
+            print(f"Error during initialization of {self.symbol}: {e}")
+            self.notify("Trading Bot Error", f"Error during initialization of {self.symbol}: {e}")
+
+    # Function to place buy and sell orders
+    def place_order(self, side, quantity):
+        symbol = self.symbol
+        try:
+            with registry.timer('place_order', symbol=symbol, side=side):
+                if side == 'BUY':
+                    print(f"Placing Buy Order for {quantity} {symbol}")
+                    order = self.client.order_market_buy(symbol=symbol, quantity=quantity)
+                elif side == 'SELL':
+                    print(f"Placing Sell Order for {quantity} {symbol}")
+                    order = self.client.order_market_sell(symbol=symbol, quantity=quantity)
+
+            self.ledger.apply_fill(symbol, side, order)
+            status = order.get('status')
+            executed_qty, quote_qty, commission, base_commission = fill_amounts(order, symbol[:-4])
+            price = quote_qty / executed_qty if executed_qty > 0 else None
+
+            print(f"{side} Order Placed: Status = {status}, Quantity = {executed_qty}, Price = {price}")
+
+            # Send notification
+            subject = f"{side} Order for {symbol} - Status: {status}"
+            message = (
+                f"{side} Order Details:\n"
+                f"Status: {status}\n"
+                f"Quantity: {executed_qty}\n"
+                f"Price: {price:.2f}\n"
+            )
+            self.notify(subject, message)
+
+            return {
+                "status": status,
+                "quantity": executed_qty,
+                "price": price,
+                "quote_qty": quote_qty,     # Quote value of the fill
+                "commission": commission,   # Fees taken from the quote asset (a SELL, unless paid in BNB)
+                "base_commission": base_commission,  # Fees taken from the coin (a BUY, unless paid in BNB)
+            }
+        except Exception as e:
+            print(f"Error placing {side} order: {e}")
+            if is_filter_rejection(e):
+                # The symbol's rules may have changed: reload them before the next order
+                self.rules.invalidate()
+            if getattr(e, 'code', None) == -2010:
+                # Insufficient balance: the ledger is out of step, so the next order reconciles it first
+                self.ledger.invalidate()
+            subject = f"{side} Order Failed for {symbol}"
+            message = f"An error occurred while placing the {side} order:\n{e}"
+            self.notify(subject, message)
+
+            return None
+
+    # Buy and Sell Execution Functions
+    def buy(self, price):
+        state = self.state
+        if state['balance'] > 0:
+            if state['position'] == 0:  # If no position (initial buy)
+                # Use max_usdt to limit the amount spent
+                available_usdt_to_spend = min(state['balance'], state['max_usdt']) * 0.99  # Reserve 1% for fees
+            else:
+                # After initialization, use the balance generated from sales
+                available_usdt_to_spend = state['balance'] * 0.99  # Reserve 1% for fees
+
+            # Never more than the account has free: reading the ledger reconciles it with Binance when due
+            available_usdt_to_spend = min(available_usdt_to_spend, self.ledger.free('USDT') * 0.99)
+
+            # Calculate the quantity to buy based on the available USDT
+            trade_quantity = available_usdt_to_spend / price
+
+            # Adjust quantity according to lot size filter
+            lot_size_filter = self.get_lot_size_filter()
+            if lot_size_filter:
+                trade_quantity = adjust_quantity_to_lot_size(trade_quantity, lot_size_filter)
+            else:
+                print("Unable to adjust quantity to LOT_SIZE.")
+                return
+
+            # Log balance and trade details
+            print(f"Available USDT to spend: {available_usdt_to_spend}, Trade Quantity: {trade_quantity}, Price: {price}")
+
+            # Place the buy order
+            try:
+                order_response = self.place_order('BUY', trade_quantity)
+                if order_response and order_response['status'] == 'FILLED':  # Check if the order was filled
+                    # Track what the fill actually cost and delivered (slippage and fees included), not the plan
+                    state['position'] += order_response['quantity'] - order_response['base_commission']
+                    state['balance'] -= order_response['quote_qty'] + order_response['commission']
+                    print(f"Buy successful: Position = {state['position']}, Balance = {state['balance']}")
+                else:
+                    print("Buy order not filled, balance not updated.")
+            except Exception as e:
+                print(f"Error during buy: {e}")
+                self.notify("Buy Order Failed", f"Error: {e}")
+
+    def sell(self, price):
+        state = self.state
+        if state['position'] > 0:
+            lot_size_filter = self.get_lot_size_filter()
+            # Never more than the account holds: reading the ledger reconciles it with Binance when due
+            held = min(state['position'], self.ledger.free(self.symbol[:-4]))
+            trade_quantity = adjust_quantity_to_lot_size(held, lot_size_filter)
+            order_response = self.place_order('SELL', trade_quantity)
+            if order_response:
+                # What the sale actually paid, after slippage and fees
+                sale_value = order_response['quote_qty'] - order_response['commission']
+
+                # Update state: position is 0 (less than one lot step may be left, which cannot be sold), balance gains the proceeds
+                state['balance'] += sale_value
+                state['position'] = 0  # All coins converted to cash
+                print(f"Sell successful: Position = {state['position']}, Balance = {state['balance']}")
+
+    # Function to buy or sell when the trend given by the EMAs flips
+    def act_on_trend(self, last_short_ema, last_long_ema, last_close_price):
+        symbol = self.symbol
+
+        # Determine current trend
+        current_trend = "bullish" if last_short_ema > last_long_ema else "bearish"
+
+        # Check for buy/sell signals based on trend change
+        if current_trend == "bullish" and self.state["trend"] != "bullish":
+            print(f"Buy signal detected for {symbol}.")
+            self.buy(last_close_price)
+            self.notify(f"Buy Signal for {symbol}", f"Buy executed at {last_close_price:.2f}")
+            self.state["trend"] = "bullish"
+
+        elif current_trend == "bearish" and self.state["trend"] != "bearish":
+            print(f"Sell signal detected for {symbol}.")
+            self.sell(last_close_price)
+            self.notify(f"Sell Signal for {symbol}", f"Sell executed at {last_close_price:.2f}")
+            self.state["trend"] = "bearish"
+
+    # Trading Logic (polling): fetch candles, update the EMAs and act on the forming candle
+    def trade(self):
+        df = self.fetch_ohlcv()
+        short_ema = self.emas[str(self.short_period)]
+        long_ema = self.emas[str(self.long_period)]
+        with registry.timer('ema_update', symbol=self.symbol):
+            forming_close = feed_closed_candles([short_ema, long_ema], df)
+        self.last_candle_time = short_ema.last_time
+
+        # Include the still-forming candle, as the full recalculation did
+        last_short_ema = short_ema.peek(forming_close) if forming_close is not None else short_ema.value
+        last_long_ema = long_ema.peek(forming_close) if forming_close is not None else long_ema.value
+        last_close_price = df['close'].iloc[-1]
+
+        print(f"Checking {self.symbol} | Last Close: {last_close_price:.2f} | Short EMA: {last_short_ema:.2f} | Long EMA: {last_long_ema:.2f}")
+        with registry.timer('decision', symbol=self.symbol):
+            self.act_on_trend(last_short_ema, last_long_ema, last_close_price)
+        self.save_state()
+
+    # Function to seed the EMAs (and the candle store) once before streaming
+    def seed_emas(self):
+        feed_closed_candles([self.emas[str(self.short_period)], self.emas[str(self.long_period)]], self.fetch_ohlcv())
+        self.last_candle_time = self.emas[str(self.short_period)].last_time
+        self.save_state()
+
+    # Streaming Trading Logic: called once per closed candle from the kline stream
+    def trade_on_close(self, kline, act=None):
+        """
+        act=None trades only on a candle that closed within the last interval. Older
+        candles (backfilled after a reconnect or a restart) only update the store and the
+        EMAs, so no market order goes out at a stale price; the next live candle acts on
+        the trend as it stands. act=True/False forces the choice, e.g. for a replay.
+        """
+        # Record the closed candle so the store stays in sync without any REST polling
+        last_stored = self.candle_store.last_close_time(self.symbol, self.interval)
+        if last_stored is None or kline[6] > last_stored:
+            self.candle_store.write(self.symbol, self.interval, klines_to_records([kline]))
+
+        close_time = kline[6]
+        last_close_price = float(kline[4])
+        with registry.timer('ema_update', symbol=self.symbol):
+            last_short_ema = self.emas[str(self.short_period)].update(last_close_price, close_time)
+            last_long_ema = self.emas[str(self.long_period)].update(last_close_price, close_time)
+        self.last_candle_time = close_time
+
+        print(f"Candle closed {self.symbol} | Close: {last_close_price:.2f} | Short EMA: {last_short_ema:.2f} | Long EMA: {last_long_ema:.2f}")
+        if act is None:
+            # '1M' candles vary in length: allow the longest month
+            act = time.time() * 1000 - close_time <= INTERVAL_MS.get(self.interval, 31 * 86_400_000)
+        if not act:
+            print(f"Candle {self.symbol} closed more than one interval ago: EMAs updated, no order placed")
+            self.save_state()
+            return
+        with registry.timer('decision', symbol=self.symbol):
+            self.act_on_trend(last_short_ema, last_long_ema, last_close_price)
+        self.save_state()
+
+        # Time from the candle closing on the exchange to the bot having acted on it (orders included)
+        registry.observe('candle_close_to_done', time.time() - (close_time + 1) / 1000, symbol=self.symbol)
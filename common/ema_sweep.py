@@ -0,0 +1,147 @@
+import numpy as np
+import pandas as pd
+from multiprocessing import shared_memory
+from concurrent.futures import ProcessPoolExecutor
+import os
+
+from analytics import bars_per_year, performance_metrics
+from backtest_engine import crossover_backtest
+from indicator_bank import ema_matrix
+
+# Worker-side view of the shared candle arrays, set up once per process by _init_worker
+_worker = {}
+
+# The scripts backtest hourly candles unless told otherwise
+HOURLY_BARS_PER_YEAR = bars_per_year('1h')
+
+# Columns of the sweep table besides the final balance and total return (see analytics.py)
+SUMMARY_METRICS = ['Max Drawdown %', 'Sharpe', 'Sortino', 'Calmar', 'Win Rate %', 'Trades', 'Exposure %']
+
+# Function to parse a period range such as "5:100:5" (start:stop:step, stop inclusive) or "7,25,50"
+def parse_periods(spec):
+    if ':' in spec:
+        parts = [int(p) for p in spec.split(':')]
+        start, stop = parts[0], parts[1]
+        step = parts[2] if len(parts) > 2 else 1
+        return list(range(start, stop + 1, step))
+    return [int(p) for p in spec.split(',')]
+
+# Function to copy the close prices (and optionally their EMAs) of every symbol into one shared memory block
+def share_closes(closes, periods=None):
+    """
+    closes: dict of symbol -> 1-D array of close prices; periods: optional dict of
+    symbol -> EMA periods to precompute with ema_matrix and share next to the prices.
+    Returns the SharedMemory block (the caller must close and unlink it) and the layout
+    workers need to find each symbol's prices and EMA rows.
+    """
+    periods = periods or {}
+    total = sum(len(c) * (1 + len(periods.get(symbol, ()))) for symbol, c in closes.items())
+    shm = shared_memory.SharedMemory(create=True, size=max(total, 1) * 8)
+    buffer = np.ndarray((total,), dtype=np.float64, buffer=shm.buf)
+    layout = {}
+    offset = 0
+    for symbol, close in closes.items():
+        n = len(close)
+        symbol_periods = sorted(periods.get(symbol, ()))
+        buffer[offset:offset + n] = close
+        if symbol_periods:
+            buffer[offset + n:offset + n * (1 + len(symbol_periods))] = ema_matrix(close, symbol_periods).ravel()
+        layout[symbol] = (offset, n, symbol_periods)
+        offset += n * (1 + len(symbol_periods))
+    return shm, layout
+
+def _init_worker(shm_name, layout, initial_balance, periods_per_year):
+    shm = shared_memory.SharedMemory(name=shm_name)
+    total = sum(n * (1 + len(periods)) for _, n, periods in layout.values())
+    buffer = np.ndarray((total,), dtype=np.float64, buffer=shm.buf)
+    _worker['shm'] = shm  # Keep the mapping alive for the life of the worker
+    _worker['closes'] = {symbol: buffer[offset:offset + n] for symbol, (offset, n, _) in layout.items()}
+    _worker['initial_balance'] = initial_balance
+    _worker['periods_per_year'] = periods_per_year
+    _worker['emas'] = {}
+    for symbol, (offset, n, periods) in layout.items():
+        rows = buffer[offset + n:offset + n * (1 + len(periods))].reshape(len(periods), n)
+        for period, row in zip(periods, rows):
+            _worker['emas'][(symbol, period)] = row
+
+# Function to get an EMA for a worker: shared by the parent, or computed once per process if it was not
+def _worker_ema(symbol, period):
+    key = (symbol, period)
+    if key not in _worker['emas']:
+        close = pd.Series(_worker['closes'][symbol])
+        _worker['emas'][key] = close.ewm(span=period, adjust=False).mean().to_numpy()
+    return _worker['emas'][key]
+
+# Function to summarize one backtest the way the sweep table reports it
+def summarize(result, initial_balance, periods_per_year=HOURLY_BARS_PER_YEAR):
+    metrics = performance_metrics(result.equity, periods_per_year, result.in_position)
+    return {
+        'Final Balance': result.balance,
+        'Total Return %': (result.balance - initial_balance) / initial_balance * 100,
+        **{name: metrics[name] for name in SUMMARY_METRICS},
+    }
+
+def _run_combo(task):
+    # (symbol, short, long) over the whole history, or (symbol, short, long, start, end) over bars start:end
+    symbol, short_period, long_period = task[:3]
+    start, end = task[3:] if len(task) > 3 else (0, None)
+    close = _worker['closes'][symbol]
+    initial_balance = _worker['initial_balance']
+
+    # The EMAs are computed over the whole history once and sliced, so every window sees warmed-up
+    # values; the window starts one bar early so a crossover on its first bar is not missed
+    lo = max(start - 1, 0)
+    result = crossover_backtest(close[lo:end], _worker_ema(symbol, short_period)[lo:end],
+                                _worker_ema(symbol, long_period)[lo:end], initial_balance=initial_balance)
+    summary = summarize(result, initial_balance, _worker['periods_per_year'])
+    return {'Symbol': symbol, 'Short EMA': short_period, 'Long EMA': long_period, **summary}
+
+# Function to run backtest tasks over a process pool that shares the close prices
+def run_tasks(closes, tasks, initial_balance=1000.0, workers=None, periods_per_year=HOURLY_BARS_PER_YEAR):
+    """
+    closes: dict of symbol -> close prices (already loaded once by the caller). The prices
+    and the EMAs of every period the tasks use are placed in shared memory so each task
+    ships only (symbol, short, long[, start, end]) to the workers. Returns one result
+    dict per task, in order.
+    """
+    workers = workers or os.cpu_count()
+    # Every EMA the tasks need is computed once here and shared, instead of once in every worker
+    periods = {}
+    for symbol, short_period, long_period in (task[:3] for task in tasks):
+        periods.setdefault(symbol, set()).update((short_period, long_period))
+    shm, layout = share_closes(closes, periods)
+    try:
+        with ProcessPoolExecutor(max_workers=workers, initializer=_init_worker,
+                                 initargs=(shm.name, layout, initial_balance, periods_per_year)) as pool:
+            chunksize = max(1, len(tasks) // (workers * 4))
+            return list(pool.map(_run_combo, tasks, chunksize=chunksize))
+    finally:
+        shm.close()
+        shm.unlink()
+
+# Function to run every (symbol, short, long) combination over a process pool
+def sweep(closes, short_periods, long_periods, initial_balance=1000.0, workers=None,
+          periods_per_year=HOURLY_BARS_PER_YEAR, rank_by='Total Return %'):
+    """
+    closes: dict of symbol -> close prices (already loaded once by the caller). The prices
+    are placed in shared memory so each task ships only (symbol, short, long) to the
+    workers. Returns the results ranked by `rank_by` (any column, e.g. 'Sharpe'), best first.
+    """
+    tasks = [(symbol, s, l) for symbol in closes for s in short_periods for l in long_periods if s < l]
+    if not tasks:
+        return pd.DataFrame()
+
+    results = pd.DataFrame(run_tasks(closes, tasks, initial_balance, workers, periods_per_year))
+    results = results.sort_values(rank_by, ascending=False)
+    return results.reset_index(drop=True)
+
+if __name__ == '__main__':
+    import time
+
+    # Synthetic year of hourly candles for a few symbols
+    rng = np.random.default_rng(0)
+    closes = {f'SYM{i}USDT': 100 * np.exp(np.cumsum(rng.normal(0, 0.01, 24 * 365))) for i in range(4)}
+    start = time.perf_counter()
+    ranked = sweep(closes, range(2, 60, 2), range(10, 300, 10))
+    print(ranked.head(10).to_string())
+    print(f"{len(ranked)} combinations in {time.perf_counter() - start:.2f}s")
@@ -0,0 +1,247 @@
+import threading
+from collections import OrderedDict
+
+import numpy as np
+import pandas as pd
+
+# Function to compute the EMAs of one series for many spans into one (spans x bars) array
+def ema_matrix(close, spans):
+    """
+    Row i is close.ewm(span=spans[i], adjust=False).mean(). All spans are computed together
+    in blocks of bars: inside a block every span's EMA is a scaled cumulative sum, done for
+    all spans and blocks at once, and only the value carried from one block into the next
+    is stepped bar-block by bar-block. The block is kept short enough that the scaling
+    (decay ** -bars) cannot overflow. A series with missing closes goes through pandas,
+    which weights the bars around a gap its own way.
+    """
+    close = np.asarray(close, dtype=np.float64)
+    n = len(close)
+    out = np.empty((len(spans), n), dtype=np.float64)
+    if n == 0 or not len(spans):
+        return out
+    if np.isnan(close).any():
+        series = pd.Series(close)
+        for i, span in enumerate(spans):
+            out[i] = series.ewm(span=span, adjust=False).mean().to_numpy()
+        return out
+
+    alpha = 2.0 / (np.asarray(spans, dtype=np.float64) + 1.0)
+    decay = 1.0 - alpha
+    live = decay > 0
+    out[~live] = close  # span 1 is the close itself
+    if not live.any():
+        return out
+    a = alpha[live][:, None, None]
+    d = decay[live][:, None, None]
+    block = int(max(1, min(4096, 200 / -np.log10(d.min()))))
+    n_blocks = -(-n // block)
+    x = np.zeros(n_blocks * block)
+    x[:n] = close
+    j = np.arange(block)
+
+    # EMA of each block as if it started from 0: decay**j * cumsum(alpha * x[k] / decay**k)
+    rows = x.reshape(1, n_blocks, block) * (a * d ** -j)
+    np.cumsum(rows, axis=2, out=rows)
+    rows *= d ** j
+
+    # Carry each block's last value into the next; the first bar starts the EMA at its own close
+    step = d[:, 0, 0] ** block
+    tails = rows[:, :, -1].copy()
+    carried = np.empty((len(step), n_blocks))
+    carry = np.full(len(step), close[0])
+    for b in range(n_blocks):
+        carried[:, b] = carry
+        carry = step * carry + tails[:, b]
+    rows += d ** (j + 1) * carried[:, :, None]
+    out[live] = rows.reshape(len(step), -1)[:, :n]
+    return out
+
+# Function to compute the simple moving averages of one series for many windows into one array
+def sma_matrix(close, windows):
+    """
+    Row i is close.rolling(window=windows[i]).mean(): NaN until the window is full, and
+    while a missing close is inside it. One pass of prefix sums serves every window. The
+    sums restart every max(windows) bars, so they stay as exact as pandas' rolling sum on
+    long, high-priced series, where one global cumulative sum loses precision.
+    """
+    close = np.asarray(close, dtype=np.float64)
+    n = len(close)
+    out = np.full((len(windows), n), np.nan)
+    if n == 0 or not len(windows):
+        return out
+    missing = np.isnan(close)
+    block = int(max(windows))
+    n_blocks = -(-n // block) + 1  # One leading block of zeros for the windows that start at the first bar
+    x = np.zeros(n_blocks * block)
+    x[block:block + n] = np.where(missing, 0.0, close)
+    local = np.cumsum(x.reshape(n_blocks, block), axis=1)
+    # Minus what is left of the block after each bar, for windows that start in the previous block
+    rest = (local - local[:, -1:]).ravel()
+    local = local.ravel()
+    offset = np.arange(len(local)) % block
+    gaps = np.concatenate(([0], np.cumsum(missing)))  # Missing closes so far, counted exactly
+
+    end = slice(block, block + n)
+    for i, window in enumerate(windows):
+        window = int(window)
+        if window > n:
+            continue
+        start = slice(block - window, block - window + n)
+        crossed = offset[start] >= offset[end]
+        np.subtract(local[end], np.where(crossed, rest[start], local[start]), out=out[i])
+        out[i] /= window
+        out[i, :window - 1] = np.nan
+        out[i, window - 1:][gaps[window:] != gaps[:n + 1 - window]] = np.nan
+    return out
+
+_MATRIX_FUNCTIONS = {'ema': ema_matrix, 'sma': sma_matrix}
+
+class IndicatorBank:
+    """
+    Cache of EMA/SMA matrices keyed by (symbol, interval, last bar, number of bars), so
+    the backtest, the plots and the bots share one computation per candle instead of
+    each calling ewm/rolling per span. The last close is stored with each entry: a
+    still-forming candle keeps its close_time while its close moves, so a changed close
+    recomputes the entry in place. Every span ever asked for on a symbol/interval is
+    remembered, and when a new bar arrives all of them are computed in one go. Spans
+    asked for later on the same bar are added to the cached matrix.
+    """
+
+    def __init__(self, max_entries=64):
+        self.max_entries = max_entries
+        self.entries = OrderedDict()  # (symbol, interval, kind, last_bar, n_bars) -> (last_close, spans, matrix)
+        self.known_spans = {}         # (symbol, interval, kind) -> spans requested so far
+        self.lock = threading.RLock()
+        self.hits = 0
+        self.misses = 0
+
+    # Function to get the rows of the indicator matrix for the given spans
+    def get(self, symbol, interval, data, spans, kind='ema'):
+        """
+        data: a fetch_ohlcv DataFrame (its 'close' column, keyed by the last 'close_time'
+        or index value) or a Series of closes (keyed by its last index value). Returns a
+        (len(spans) x bars) array; do not modify it, it is shared with other callers.
+        """
+        close, last_bar = _close_and_last_bar(data)
+        spans = [int(span) for span in spans]
+        if not spans:
+            return np.empty((0, len(close)), dtype=np.float64)
+        key = (symbol, interval, kind, last_bar, len(close))
+        last_close = close[-1] if len(close) else np.nan
+        with self.lock:
+            known = self.known_spans.setdefault((symbol, interval, kind), set())
+            known.update(spans)
+            cached_close, cached_spans, matrix = self.entries.get(key, (None, [], None))
+            if matrix is not None and not _same_close(cached_close, last_close):
+                # Same bar, new close: the forming candle moved, so every cached row is stale
+                cached_spans, matrix = [], None
+            missing = [span for span in spans if span not in cached_spans]
+            if missing:
+                self.misses += 1
+                # Compute every span seen on this symbol so far, not only the ones asked for now
+                new_spans = sorted(known - set(cached_spans))
+                new_rows = _MATRIX_FUNCTIONS[kind](close, new_spans)
+                cached_spans = list(cached_spans) + new_spans
+                matrix = new_rows if matrix is None else np.vstack((matrix, new_rows))
+                self.entries[key] = (last_close, cached_spans, matrix)
+                while len(self.entries) > self.max_entries:
+                    self.entries.popitem(last=False)
+            else:
+                self.hits += 1
+            self.entries.move_to_end(key)
+
+        # Consecutive rows come back as a view of the cached block, anything else as a copy
+        rows = [cached_spans.index(span) for span in spans]
+        if rows == list(range(rows[0], rows[0] + len(rows))):
+            return matrix[rows[0]:rows[0] + len(rows)]
+        return matrix[rows]
+
+    # Function to get one EMA as a 1-D array aligned with the data
+    def ema(self, symbol, interval, data, span):
+        return self.get(symbol, interval, data, [span], 'ema')[0]
+
+    # Function to get one simple moving average as a 1-D array aligned with the data
+    def sma(self, symbol, interval, data, window):
+        return self.get(symbol, interval, data, [window], 'sma')[0]
+
+    # Function to get several indicators as DataFrame columns ('ema_50', 'sma_200', ...) on the data's index
+    def frame(self, symbol, interval, data, ema=(), sma=()):
+        index = data.index
+        columns = {}
+        for kind, spans in (('ema', ema), ('sma', sma)):
+            if spans:
+                for span, row in zip(spans, self.get(symbol, interval, data, spans, kind)):
+                    columns[f'{kind}_{span}'] = row
+        return pd.DataFrame(columns, index=index)
+
+    def clear(self):
+        with self.lock:
+            self.entries.clear()
+            self.known_spans.clear()
+
+# Function to compare two closes, treating NaN as equal to NaN
+def _same_close(a, b):
+    return a == b or (np.isnan(a) and np.isnan(b))
+
+def _close_and_last_bar(data):
+    if isinstance(data, pd.DataFrame):
+        close = data['close'].to_numpy(dtype=np.float64)
+        last = data['close_time'].iloc[-1] if 'close_time' in data.columns and len(data) else (
+            data.index[-1] if len(data) else None)
+    else:
+        close = np.asarray(data, dtype=np.float64)
+        last = data.index[-1] if isinstance(data, pd.Series) and len(data) else None
+    return close, last
+
+# The bank shared by everything in one process
+bank = IndicatorBank()
+
+if __name__ == '__main__':
+    import time
+
+    # Check the bank against pandas on synthetic prices and time it against per-span recomputation
+    rng = np.random.default_rng(0)
+    index = pd.date_range('2024-01-01', periods=20000, freq='h')
+    df = pd.DataFrame({'close': 100 * np.exp(np.cumsum(rng.normal(0, 0.01, len(index))))}, index=index)
+    spans = [1, 7, 25, 50, 100, 200]
+
+    for span in spans:
+        expected = df['close'].ewm(span=span, adjust=False).mean().to_numpy()
+        assert np.allclose(bank.ema('TEST', '1h', df, span), expected, rtol=1e-12)
+        expected = df['close'].rolling(window=span).mean().to_numpy()
+        assert np.allclose(bank.sma('TEST', '1h', df, span), expected, rtol=1e-9, equal_nan=True)
+    assert bank.get('TEST', '1h', df, spans).flags['C_CONTIGUOUS']
+
+    # A forming candle keeps its close_time while its close moves: the EMAs must follow the close
+    forming = pd.DataFrame({'close': [100.0, 101.0, 102.0], 'close_time': [1, 2, 3]})
+    first = bank.ema('FORMING', '1m', forming, 2)[-1]
+    forming.loc[2, 'close'] = 90.0
+    assert bank.ema('FORMING', '1m', forming, 2)[-1] != first
+    assert np.isclose(bank.ema('FORMING', '1m', forming, 2)[-1], forming['close'].ewm(span=2, adjust=False).mean().iloc[-1])
+
+    # All spans at once stay exact on long, high-priced series; SMAs recover once a missing close leaves the window
+    long_series = pd.Series(60_000 + np.cumsum(rng.normal(0, 50, 2_000_000)))
+    windows = [1, 2, 7, 25, 200]
+    for span, row in zip(windows, ema_matrix(long_series, windows)):
+        assert np.allclose(row, long_series.ewm(span=span, adjust=False).mean().to_numpy(), rtol=1e-12)
+    gapped = long_series.copy()
+    gapped.iloc[1000] = np.nan
+    for window, row in zip(windows, sma_matrix(gapped, windows)):
+        assert np.allclose(row, gapped.rolling(window=window).mean().to_numpy(), rtol=1e-12, equal_nan=True)
+    for span, row in zip(windows, ema_matrix(gapped[:5000], windows)):
+        assert np.allclose(row, gapped[:5000].ewm(span=span, adjust=False).mean().to_numpy(), rtol=1e-12)
+    assert np.isnan(sma_matrix([1.0, 2.0], [3])).all()
+
+    repeats = 50
+    start = time.perf_counter()
+    for _ in range(repeats):
+        for span in spans:
+            df['close'].ewm(span=span, adjust=False).mean()
+    per_call = time.perf_counter() - start
+    start = time.perf_counter()
+    for _ in range(repeats):
+        bank.frame('TEST', '1h', df, ema=spans)
+    cached = time.perf_counter() - start
+    print(f"Bank matches pandas ewm/rolling; {len(spans)} EMAs x {repeats} runs: "
+          f"{per_call * 1000:.1f}ms recomputed vs {cached * 1000:.1f}ms from the bank "
+          f"({bank.hits} hits, {bank.misses} misses)")
@@ -0,0 +1,88 @@
+import numpy as np
+import pandas as pd
+import time
+
+class IncrementalEMA:
+    """
+    EMA that is seeded once from history and then updated in constant time per closed
+    candle. Follows the same recurrence as pandas' ewm(span=period, adjust=False):
+    ema = (1 - alpha) * ema + alpha * close, with alpha = 2 / (period + 1).
+    """
+
+    def __init__(self, period, value=None, previous=None, last_time=None):
+        self.period = period
+        self.alpha = 2 / (period + 1)
+        self.value = value          # EMA after the last closed candle
+        self.previous = previous    # EMA one candle before that
+        self.last_time = last_time  # close_time of the last candle applied
+
+    # Function to seed the EMA from a history of closed candles
+    def seed(self, closes, times=None):
+        ema = pd.Series(np.asarray(closes, dtype=np.float64)).ewm(span=self.period, adjust=False).mean().to_numpy()
+        self.value = float(ema[-1]) if len(ema) else None
+        self.previous = float(ema[-2]) if len(ema) > 1 else None
+        self.last_time = int(times[-1]) if times is not None and len(times) else None
+        return self.value
+
+    # Function to apply one closed candle; candles at or before last_time are ignored
+    def update(self, close, time=None):
+        if time is not None and self.last_time is not None and time <= self.last_time:
+            return self.value
+        self.previous = self.value
+        self.value = self.peek(close)
+        if time is not None:
+            self.last_time = int(time)
+        return self.value
+
+    # Function to see what the EMA would be with one more close, without applying it
+    def peek(self, close):
+        if self.value is None:
+            return float(close)
+        return (1 - self.alpha) * self.value + self.alpha * float(close)
+
+    def snapshot(self):
+        return {'period': self.period, 'value': self.value, 'previous': self.previous, 'last_time': self.last_time}
+
+    @classmethod
+    def restore(cls, snapshot):
+        return cls(snapshot['period'], snapshot['value'], snapshot['previous'], snapshot['last_time'])
+
+# Function to bring a set of EMAs up to date from a fetch_ohlcv DataFrame
+def feed_closed_candles(emas, df, now_ms=None):
+    """
+    Applies the closed candles in df that each EMA has not seen yet (seeding it from
+    the whole frame the first time, or again if it missed candles that are no longer
+    in the frame). Returns the close of the still-forming candle, or None.
+    """
+    now_ms = int(time.time() * 1000) if now_ms is None else now_ms
+    close_times = df['close_time'].to_numpy()
+    closes = df['close'].to_numpy()
+    closed = close_times < now_ms
+
+    closed_times = close_times[closed]
+    closed_closes = closes[closed]
+    for ema in emas:
+        if ema.value is None or ema.last_time is None or not len(closed_times) or ema.last_time < closed_times[0]:
+            ema.seed(closed_closes, closed_times)
+            continue
+        for i in np.flatnonzero(closed_times > ema.last_time):
+            ema.update(closed_closes[i], closed_times[i])
+
+    forming = closes[~closed]
+    return float(forming[-1]) if len(forming) else None
+
+if __name__ == '__main__':
+    # Check the incremental EMA against pandas on synthetic prices
+    rng = np.random.default_rng(0)
+    closes = 100 * np.exp(np.cumsum(rng.normal(0, 0.01, 5000)))
+    for period in [1, 7, 25, 50, 200]:
+        expected = pd.Series(closes).ewm(span=period, adjust=False).mean().to_numpy()
+        ema = IncrementalEMA(period)
+        ema.seed(closes[:1000], np.arange(1000))
+        ema = IncrementalEMA.restore(ema.snapshot())
+        for t in range(1000, len(closes)):
+            assert np.isclose(ema.peek(closes[t]), expected[t], rtol=1e-12)
+            ema.update(closes[t], t)
+        assert np.isclose(ema.value, expected[-1], rtol=1e-12)
+        assert np.isclose(ema.previous, expected[-2], rtol=1e-12)
+    print("Incremental EMA matches pandas ewm(adjust=False)")
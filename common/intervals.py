@@ -0,0 +1,33 @@
+import numbers
+
+import pandas as pd
+
+# Length of each fixed Binance interval in milliseconds ('1M' months vary, so they are not split)
+INTERVAL_MS = {
+    '1s': 1000, '1m': 60_000, '3m': 180_000, '5m': 300_000, '15m': 900_000, '30m': 1_800_000,
+    '1h': 3_600_000, '2h': 7_200_000, '4h': 14_400_000, '6h': 21_600_000, '8h': 28_800_000,
+    '12h': 43_200_000, '1d': 86_400_000, '3d': 259_200_000, '1w': 604_800_000,
+}
+
+# Average calendar month in milliseconds, for estimates that need a length for '1M'
+MONTH_MS = int(365.25 / 12 * 86_400_000)
+
+# Function to get the length of an interval in milliseconds, counting '1M' as an average month
+def interval_ms(interval):
+    if interval == '1M':
+        return MONTH_MS
+    return INTERVAL_MS[interval]
+
+# Function to turn a date string, datetime or epoch milliseconds into epoch milliseconds
+def to_ms(value):
+    if isinstance(value, numbers.Integral):
+        return int(value)
+    return int(pd.Timestamp(value).value // 1_000_000)
+
+if __name__ == '__main__':
+    import numpy as np
+
+    assert to_ms('2024-01-01') == to_ms(pd.Timestamp('2024-01-01')) == 1_704_067_200_000
+    assert to_ms(np.int64(1_704_067_200_000)) == 1_704_067_200_000
+    assert interval_ms('4h') == 4 * interval_ms('1h') and 30 * 86_400_000 < interval_ms('1M') < 31 * 86_400_000
+    print("Interval helpers OK")
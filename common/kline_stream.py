@@ -0,0 +1,130 @@
+import asyncio
+import time
+
+from candle_store import KLINE_DTYPE
+
+# Function to turn a websocket kline payload into the REST kline list layout
+def stream_kline_to_list(k):
+    return [k['t'], k['o'], k['h'], k['l'], k['c'], k['v'], k['T'], k['q'], k['n'], k['V'], k['Q'], '0']
+
+# Function to turn a stored candle record back into the REST kline list layout
+def record_to_list(record):
+    return [record[name].item() for name in KLINE_DTYPE.names] + ['0']
+
+class MultiKlineStream:
+    """
+    Async iterator over closed candles for many symbols from one multiplexed Binance
+    kline websocket, yielding (symbol, kline). Candles that are still forming are
+    skipped. After a disconnect (or if a candle is missed) the gap is filled from the
+    REST API before streaming resumes, so every closed candle after a symbol's
+    last_close_time is yielded exactly once, in order. A shared WeightRateLimiter can
+    be passed so the backfills count against the same request-weight budget.
+    """
+
+    def __init__(self, symbols, interval='1h', api_key=None, api_secret=None, last_close_times=None,
+                 reconnect_delay=1, max_reconnect_delay=60, limiter=None):
+        self.symbols = list(symbols)
+        self.interval = interval
+        self.api_key = api_key
+        self.api_secret = api_secret
+        self.last_close_times = dict(last_close_times or {})
+        self.reconnect_delay = reconnect_delay
+        self.max_reconnect_delay = max_reconnect_delay
+        self.limiter = limiter
+
+    # Function to fetch the closed candles after a symbol's last_close_time from the REST API
+    async def _backfill(self, client, symbol, until_open_time=None):
+        missed = []
+        while True:
+            if self.limiter:
+                await self.limiter.acquire_async(2)
+            klines = await client.get_klines(symbol=symbol, interval=self.interval,
+                                             startTime=self.last_close_times[symbol] + 1, limit=1000)
+            now_ms = int(time.time() * 1000)
+            closed = [k for k in klines if k[6] < now_ms and (until_open_time is None or k[0] < until_open_time)]
+            missed.extend(closed)
+            if closed:
+                self.last_close_times[symbol] = closed[-1][6]
+            if len(klines) < 1000 or not closed:
+                return missed
+
+    async def __aiter__(self):
+        from binance import AsyncClient, BinanceSocketManager
+
+        client = await AsyncClient.create(self.api_key, self.api_secret)
+        streams = {f"{symbol.lower()}@kline_{self.interval}": symbol for symbol in self.symbols}
+        delay = self.reconnect_delay
+        try:
+            while True:
+                try:
+                    # Catch up on anything that closed while we were disconnected
+                    for symbol in self.symbols:
+                        if self.last_close_times.get(symbol) is not None:
+                            for kline in await self._backfill(client, symbol):
+                                yield symbol, kline
+
+                    socket_manager = BinanceSocketManager(client)
+                    async with socket_manager.multiplex_socket(list(streams)) as socket:
+                        delay = self.reconnect_delay
+                        while True:
+                            message = await socket.recv()
+                            if message.get('e') == 'error':
+                                raise ConnectionError(message.get('m', 'kline stream error'))
+                            symbol = streams.get(message.get('stream'))
+                            if symbol is None:
+                                continue
+                            k = message['data']['k']
+                            if not k['x']:
+                                continue  # Candle still forming
+                            last_close_time = self.last_close_times.get(symbol)
+                            if last_close_time is not None and k['T'] <= last_close_time:
+                                continue  # Already yielded (e.g. during a backfill)
+                            if last_close_time is not None and k['t'] > last_close_time + 1:
+                                # One or more candles were missed: fill them in from REST first
+                                for kline in await self._backfill(client, symbol, until_open_time=k['t']):
+                                    yield symbol, kline
+                            self.last_close_times[symbol] = k['T']
+                            yield symbol, stream_kline_to_list(k)
+                except asyncio.CancelledError:
+                    raise
+                except Exception as e:
+                    print(f"Kline stream disconnected ({e}), reconnecting in {delay}s")
+                    await asyncio.sleep(delay)
+                    delay = min(delay * 2, self.max_reconnect_delay)
+        finally:
+            await client.close_connection()
+
+class BinanceKlineStream:
+    """
+    Async iterator over closed candles for a single symbol (see MultiKlineStream).
+    """
+
+    def __init__(self, symbol, interval='1h', api_key=None, api_secret=None, last_close_time=None,
+                 reconnect_delay=1, max_reconnect_delay=60, limiter=None):
+        self.stream = MultiKlineStream([symbol], interval, api_key, api_secret, {symbol: last_close_time},
+                                       reconnect_delay, max_reconnect_delay, limiter)
+
+    async def __aiter__(self):
+        async for _, kline in self.stream:
+            yield kline
+
+class ReplayKlineStream:
+    """
+    Local stand-in for BinanceKlineStream: yields recorded closed candles (REST kline
+    lists or candle store records), optionally pausing between them.
+    """
+
+    def __init__(self, klines, delay=0.0):
+        self.klines = klines
+        self.delay = delay
+
+    async def __aiter__(self):
+        for kline in self.klines:
+            if self.delay:
+                await asyncio.sleep(self.delay)
+            yield kline if isinstance(kline, list) else record_to_list(kline)
+
+# Function to call on_close for every closed candle in a stream
+async def run_on_close(stream, on_close):
+    async for kline in stream:
+        on_close(kline)
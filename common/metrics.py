@@ -0,0 +1,197 @@
+import atexit
+import bisect
+import json
+import os
+import threading
+import time
+from functools import wraps
+
+# Histogram bucket upper bounds, in seconds
+DEFAULT_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+
+# Setting METRICS_FILE turns the metrics on and is where they are exported to
+# (Prometheus text format, or JSON if the name ends in .json)
+METRICS_FILE = os.environ.get('METRICS_FILE')
+
+class Histogram:
+    """Latency histogram with fixed buckets, plus the count, sum and max of the observations."""
+
+    def __init__(self, buckets=DEFAULT_BUCKETS):
+        self.buckets = buckets
+        self.counts = [0] * (len(buckets) + 1)  # The last bucket is +Inf
+        self.count = 0
+        self.sum = 0.0
+        self.max = 0.0
+
+    def observe(self, value):
+        self.counts[bisect.bisect_left(self.buckets, value)] += 1
+        self.count += 1
+        self.sum += value
+        self.max = max(self.max, value)
+
+    # Function to estimate a quantile as the upper bound of the bucket it falls in
+    def quantile(self, q):
+        if not self.count:
+            return None
+        rank = q * self.count
+        cumulative = 0
+        for bound, count in zip(self.buckets, self.counts):
+            cumulative += count
+            if cumulative >= rank:
+                return min(bound, self.max)
+        return self.max
+
+class _Timer:
+    def __init__(self, metrics, stage, labels):
+        self.metrics = metrics
+        self.stage = stage
+        self.labels = labels
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        self.metrics.observe(self.stage, time.perf_counter() - self.start, **self.labels)
+        return False
+
+class _NullTimer:
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+NULL_TIMER = _NullTimer()
+
+class Metrics:
+    """
+    Per-stage latency histograms and counters (e.g. API weight used), with slow-call
+    logging and export as Prometheus text or JSON. When disabled, timer() hands back a
+    shared no-op context manager and observe()/inc() return straight away, so the
+    instrumentation can stay in the hot paths.
+    """
+
+    def __init__(self, enabled=False, slow_threshold=1.0, path=None):
+        self.enabled = enabled
+        self.slow_threshold = slow_threshold  # Stages slower than this (seconds) are logged
+        self.path = path
+        self.histograms = {}  # (stage, labels) -> Histogram
+        self.counters = {}    # (name, labels) -> value
+        self.lock = threading.Lock()
+        self.exporter = None
+
+    def enable(self, path=None, slow_threshold=None):
+        self.enabled = True
+        self.path = path or self.path
+        if slow_threshold is not None:
+            self.slow_threshold = slow_threshold
+
+    def disable(self):
+        self.enabled = False
+
+    # Function to time a block: `with registry.timer('place_order', symbol=symbol):`
+    def timer(self, stage, **labels):
+        if not self.enabled:
+            return NULL_TIMER
+        return _Timer(self, stage, labels)
+
+    # Decorator version of timer()
+    def timed(self, stage, **labels):
+        def decorator(func):
+            @wraps(func)
+            def wrapper(*args, **kwargs):
+                if not self.enabled:
+                    return func(*args, **kwargs)
+                with _Timer(self, stage, labels):
+                    return func(*args, **kwargs)
+            return wrapper
+        return decorator
+
+    def observe(self, stage, seconds, **labels):
+        if not self.enabled:
+            return
+        key = (stage, tuple(sorted(labels.items())))
+        with self.lock:
+            histogram = self.histograms.get(key)
+            if histogram is None:
+                histogram = self.histograms[key] = Histogram()
+            histogram.observe(seconds)
+        if seconds >= self.slow_threshold:
+            print(f"Slow {stage}{_format_labels(labels)}: {seconds * 1000:.0f}ms")
+
+    def inc(self, name, amount=1, **labels):
+        if not self.enabled:
+            return
+        key = (name, tuple(sorted(labels.items())))
+        with self.lock:
+            self.counters[key] = self.counters.get(key, 0) + amount
+
+    # Function to export everything in the Prometheus text format
+    def to_prometheus(self):
+        lines = []
+        with self.lock:
+            if self.histograms:
+                lines.append('# TYPE stage_latency_seconds histogram')
+            for (stage, labels), histogram in sorted(self.histograms.items()):
+                labels = (('stage', stage),) + labels
+                cumulative = 0
+                for bound, count in zip(histogram.buckets + (float('inf'),), histogram.counts):
+                    cumulative += count
+                    le = '+Inf' if bound == float('inf') else repr(bound)
+                    lines.append(f"stage_latency_seconds_bucket{_format_labels(dict(labels + (('le', le),)))} {cumulative}")
+                lines.append(f"stage_latency_seconds_sum{_format_labels(dict(labels))} {histogram.sum}")
+                lines.append(f"stage_latency_seconds_count{_format_labels(dict(labels))} {histogram.count}")
+            for name in sorted({name for name, _ in self.counters}):
+                lines.append(f'# TYPE {name} counter')
+                for (counter, labels), value in sorted(self.counters.items()):
+                    if counter == name:
+                        lines.append(f"{name}{_format_labels(dict(labels))} {value}")
+        return '\n'.join(lines) + '\n'
+
+    # Function to export a summary of every stage (count, mean, p50/p95/p99, max) and the counters
+    def to_json(self):
+        with self.lock:
+            stages = [
+                {
+                    'stage': stage, 'labels': dict(labels), 'count': h.count, 'sum': h.sum,
+                    'mean': h.sum / h.count if h.count else None,
+                    'p50': h.quantile(0.5), 'p95': h.quantile(0.95), 'p99': h.quantile(0.99), 'max': h.max,
+                }
+                for (stage, labels), h in sorted(self.histograms.items())
+            ]
+            counters = [{'name': name, 'labels': dict(labels), 'value': value}
+                        for (name, labels), value in sorted(self.counters.items())]
+        return json.dumps({'stages': stages, 'counters': counters}, indent=2)
+
+    # Function to write the metrics to a file (JSON if it ends in .json, Prometheus text otherwise)
+    def write(self, path=None):
+        path = path or self.path
+        if not self.enabled or not path:
+            return
+        text = self.to_json() if path.endswith('.json') else self.to_prometheus()
+        tmp_path = path + '.tmp'
+        with open(tmp_path, 'w') as f:
+            f.write(text)
+        os.replace(tmp_path, path)
+
+    # Function to rewrite the metrics file every `every` seconds from a background thread
+    def start_export(self, path=None, every=60.0):
+        if not self.enabled or self.exporter is not None:
+            return
+
+        def export():
+            while True:
+                time.sleep(every)
+                self.write(path)
+        self.exporter = threading.Thread(target=export, name='metrics-export', daemon=True)
+        self.exporter.start()
+        atexit.register(self.write, path)
+
+def _format_labels(labels):
+    if not labels:
+        return ''
+    return '{' + ','.join(f'{key}="{value}"' for key, value in labels.items()) + '}'
+
+# The registry the bots and scripts report to; on when METRICS_FILE is set
+registry = Metrics(enabled=bool(METRICS_FILE), path=METRICS_FILE)
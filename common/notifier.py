@@ -0,0 +1,217 @@
+import atexit
+import queue
+import smtplib
+import socketserver
+import threading
+import time
+from email.mime.text import MIMEText
+
+# Errors that no retry can fix (bad credentials, refused addresses, no AUTH support): fail fast instead
+PERMANENT_SMTP_ERRORS = (smtplib.SMTPAuthenticationError, smtplib.SMTPRecipientsRefused, smtplib.SMTPSenderRefused,
+                         smtplib.SMTPNotSupportedError)
+
+class EmailNotifier:
+    """
+    Background email queue for the bots' notify(subject, message) callback. notify()
+    only puts the message on a queue and returns; a worker thread sends it over one
+    SMTP connection that stays open between emails (reconnecting if the server drops
+    it). Messages arriving within `digest_window` seconds of each other are sent as one
+    digest email, so a burst (signal + order + fill) costs one send instead of three.
+    Pending emails are sent when the process exits.
+    """
+
+    def __init__(self, sender, password, recipients, host='smtp.gmail.com', port=465, use_ssl=True,
+                 digest_window=5.0, max_batch=50, idle_timeout=300.0, retries=3):
+        self.sender = sender
+        self.password = password
+        self.recipients = recipients
+        self.host = host
+        self.port = port
+        self.use_ssl = use_ssl
+        self.digest_window = digest_window
+        self.max_batch = max_batch
+        self.idle_timeout = idle_timeout  # Close the connection after this long without emails
+        self.retries = retries
+        self.queue = queue.Queue()
+        self.smtp = None
+        self.sent = 0
+        self.thread = threading.Thread(target=self._run, name='email-notifier', daemon=True)
+        self.thread.start()
+        atexit.register(self.close)
+
+    # Function to queue a notification; never blocks the caller
+    def notify(self, subject, message):
+        self.queue.put((subject, message))
+
+    __call__ = notify
+
+    # Function to wait until every queued email has been sent (or given up on)
+    def flush(self):
+        self.queue.join()
+
+    def close(self):
+        if self.thread.is_alive():
+            self.queue.put(None)
+            self.thread.join()
+        self._disconnect()
+
+    def _run(self):
+        while True:
+            try:
+                item = self.queue.get(timeout=self.idle_timeout)
+            except queue.Empty:
+                self._disconnect()
+                continue
+            if item is None:
+                self.queue.task_done()
+                return
+
+            # Collect whatever else arrives during the digest window
+            batch = [item]
+            stop = False
+            deadline = time.monotonic() + self.digest_window
+            while len(batch) < self.max_batch:
+                try:
+                    item = self.queue.get(timeout=max(0.0, deadline - time.monotonic()))
+                except queue.Empty:
+                    break
+                if item is None:
+                    stop = True
+                    break
+                batch.append(item)
+
+            try:
+                self._send(*self._digest(batch))
+            except Exception as e:
+                print(f"Error sending email ({len(batch)} notifications): {e}")
+            finally:
+                for _ in range(len(batch) + stop):
+                    self.queue.task_done()
+            if stop:
+                return
+
+    # Function to turn a batch of notifications into one email
+    def _digest(self, batch):
+        if len(batch) == 1:
+            return batch[0]
+        subject = f"{len(batch)} notifications: {batch[0][0]}"
+        message = "\n\n".join(f"--- {subject} ---\n{message}" for subject, message in batch)
+        return subject, message
+
+    def _connect(self):
+        if self.use_ssl:
+            smtp = smtplib.SMTP_SSL(self.host, self.port, timeout=30)
+        else:
+            smtp = smtplib.SMTP(self.host, self.port, timeout=30)
+        if self.password:
+            try:
+                smtp.login(self.sender, self.password)
+            except Exception:
+                smtp.close()
+                raise
+        return smtp
+
+    def _disconnect(self):
+        if self.smtp is not None:
+            try:
+                self.smtp.quit()
+            except Exception:
+                pass
+            self.smtp = None
+
+    # Function to send one email, reusing the open connection when there is one
+    def _send(self, subject, message):
+        msg = MIMEText(message)
+        msg['Subject'] = subject
+        msg['From'] = self.sender
+        msg['To'] = ', '.join(self.recipients)
+
+        for attempt in range(self.retries):
+            try:
+                if self.smtp is None:
+                    self.smtp = self._connect()
+                self.smtp.send_message(msg)
+                self.sent += 1
+                return
+            except PERMANENT_SMTP_ERRORS:
+                # SMTPException subclasses OSError, so these must be caught before the retry below
+                raise
+            except (smtplib.SMTPServerDisconnected, smtplib.SMTPConnectError, OSError):
+                # The server closed the idle connection (or never answered): reconnect and retry
+                self._disconnect()
+                if attempt == self.retries - 1:
+                    raise
+                time.sleep(2 ** attempt)
+
+class LocalSMTPServer(socketserver.ThreadingTCPServer):
+    """
+    Minimal SMTP server that keeps the emails it receives in `messages`, for testing
+    notifiers without a real mail account. Use with EmailNotifier(..., host='127.0.0.1',
+    port=server.port, use_ssl=False, password=None).
+    """
+
+    daemon_threads = True
+    allow_reuse_address = True
+
+    def __init__(self, host='127.0.0.1', port=0):
+        super().__init__((host, port), _SMTPHandler)
+        self.port = self.server_address[1]
+        self.messages = []
+        self.connections = 0
+        threading.Thread(target=self.serve_forever, daemon=True).start()
+
+class _SMTPHandler(socketserver.StreamRequestHandler):
+    def reply(self, line):
+        self.wfile.write(line.encode() + b'\r\n')
+
+    def handle(self):
+        self.server.connections += 1
+        self.reply('220 localhost SMTP stand-in')
+        while True:
+            line = self.rfile.readline()
+            if not line:
+                return
+            command = line.decode(errors='replace').strip().upper()
+            if command.startswith(('EHLO', 'HELO')):
+                self.reply('250 localhost')
+            elif command == 'DATA':
+                self.reply('354 End data with <CR><LF>.<CR><LF>')
+                data = []
+                for line in iter(self.rfile.readline, b''):
+                    if line in (b'.\r\n', b'.\n'):
+                        break
+                    data.append(line[1:] if line.startswith(b'..') else line)
+                self.server.messages.append(b''.join(data).decode(errors='replace'))
+                self.reply('250 OK')
+            elif command == 'QUIT':
+                self.reply('221 Bye')
+                return
+            else:  # MAIL, RCPT, RSET, NOOP
+                self.reply('250 OK')
+
+if __name__ == '__main__':
+    # Send a burst through the notifier to a local stand-in and check it arrives as one digest
+    server = LocalSMTPServer()
+    notifier = EmailNotifier('bot@localhost', None, ['me@localhost'], host='127.0.0.1', port=server.port,
+                             use_ssl=False, digest_window=0.5)
+    start = time.perf_counter()
+    for i in range(5):
+        notifier.notify(f"Signal {i}", f"Message {i}")
+    print(f"Queued 5 notifications in {(time.perf_counter() - start) * 1000:.2f}ms")
+    notifier.flush()
+    notifier.notify("Later", "Sent over the same connection")
+    notifier.flush()
+    notifier.close()
+    assert len(server.messages) == 2 and 'Message 4' in server.messages[0], server.messages
+    assert server.connections == 1
+    print(f"{len(server.messages)} emails over {server.connections} connection")
+
+    # Login fails for good (the stand-in has no AUTH): the email is dropped at once, not retried with sleeps
+    failing = EmailNotifier('bot@localhost', 'wrong', ['me@localhost'], host='127.0.0.1', port=server.port,
+                            use_ssl=False, digest_window=0.0)
+    start = time.perf_counter()
+    failing.notify("Unsent", "Bad credentials")
+    failing.flush()
+    failing.close()
+    assert server.connections == 2 and time.perf_counter() - start < 0.5
+    server.shutdown()
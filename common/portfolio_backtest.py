@@ -0,0 +1,218 @@
+import numpy as np
+import pandas as pd
+from collections import namedtuple
+
+# Result of a portfolio backtest, all on the bars x symbols grid of the close matrix:
+# equity: total account value per bar
+# asset_equity: per-symbol value (the sleeve's cash + holding for 'equal', the holding for 'active')
+# positions: 1 while the symbol's crossover is long, else 0
+# weights: share of the account held in each symbol at each bar's close
+# turnover: traded value per bar as a fraction of the account (fees are fee_rate * turnover)
+PortfolioResult = namedtuple('PortfolioResult', ['equity', 'asset_equity', 'positions', 'weights', 'turnover'])
+
+# Function to line up the stored closes of many symbols on one time x symbol grid
+def load_close_matrix(candle_store, symbols, interval='1h', start_ms=None, end_ms=None):
+    """
+    Bars missing for a symbol (not listed yet, or gaps) are left as NaN; the backtest
+    treats them as flat. Reads straight from the memory-mapped store.
+    """
+    columns = {}
+    for symbol in symbols:
+        records = candle_store.read(symbol, interval)
+        if start_ms is not None:
+            records = records[records['timestamp'] >= start_ms]
+        if end_ms is not None:
+            records = records[records['timestamp'] <= end_ms]
+        columns[symbol] = pd.Series(np.array(records['close']), index=np.array(records['timestamp']))
+    closes = pd.DataFrame(columns).sort_index()
+    closes.index = pd.to_datetime(closes.index, unit='ms')
+    closes.index.name = 'timestamp'
+    return closes
+
+# Function to get the long/flat state of the crossover for every symbol at once
+def crossover_positions(closes, short_period, long_period):
+    """
+    closes: DataFrame of bars x symbols. The EMAs of every column are computed in one ewm
+    call. A symbol goes long on the bar its short EMA crosses above the long EMA and flat
+    on the bar it crosses below, as in crossover_backtest. Returns a bars x symbols array of 0/1.
+    """
+    short_ema = closes.ewm(span=short_period, adjust=False).mean().to_numpy()
+    long_ema = closes.ewm(span=long_period, adjust=False).mean().to_numpy()
+    above = short_ema > long_ema
+    below = short_ema < long_ema
+    cross_up = np.zeros(above.shape, dtype=bool)
+    cross_down = np.zeros(above.shape, dtype=bool)
+    cross_up[1:] = above[1:] & ~above[:-1] & ~np.isnan(short_ema[:-1])
+    cross_down[1:] = below[1:] & ~below[:-1] & ~np.isnan(short_ema[:-1])
+
+    # 1 from each cross up, 0 from each cross down, carried forward until the next cross
+    state = np.where(cross_up, 1.0, np.where(cross_down, 0.0, np.nan))
+    state = pd.DataFrame(state).ffill().fillna(0.0).to_numpy()
+    return state
+
+# Function to run the EMA crossover over a whole basket of symbols at once
+def portfolio_backtest(closes, short_period=50, long_period=200, allocation='equal', initial_balance=10000.0,
+                       fee_rate=0.001, max_weight=None):
+    """
+    closes: DataFrame of close prices, bars x symbols (see load_close_matrix). Trades are
+    taken at the close of the crossover bar.
+
+    allocation='equal': every symbol gets a fixed 1/N sleeve of the starting balance and
+    trades it all-in/all-out, like crossover_backtest on each symbol side by side.
+
+    allocation='active': one shared account, rebalanced to equal weights across the
+    symbols that are long whenever that set changes (each weight capped at max_weight,
+    the rest stays in cash). Between changes the holdings drift with their prices.
+
+    fee_rate is charged on the traded value. Everything is computed on the whole
+    bars x symbols matrix at once; no Python loop over bars or symbols.
+    """
+    prices = closes.ffill().to_numpy(dtype=np.float64)
+    n_bars, n_symbols = prices.shape
+    positions = crossover_positions(closes, short_period, long_period)
+
+    # Bar returns, 0 before a symbol's first price
+    returns = np.zeros_like(prices)
+    returns[1:] = prices[1:] / prices[:-1] - 1
+    returns[np.isnan(returns)] = 0.0
+
+    trades = np.zeros_like(positions)
+    trades[1:] = np.abs(np.diff(positions, axis=0))
+
+    if allocation == 'equal':
+        # A sleeve earns the symbol's return on bars after a long close and pays the fee on every trade
+        held = np.zeros_like(positions)
+        held[1:] = positions[:-1]
+        growth = (1 + held * returns) * (1 - fee_rate * trades)
+        asset_equity = initial_balance / n_symbols * np.cumprod(growth, axis=0)
+        equity = asset_equity.sum(axis=1)
+        weights = asset_equity * positions / equity[:, None]
+        turnover = (asset_equity * trades).sum(axis=1) / (1 - fee_rate) / equity
+    elif allocation == 'active':
+        asset_equity, equity, weights, turnover = _active_allocation(
+            prices, positions, returns, initial_balance, fee_rate, max_weight)
+    else:
+        raise ValueError(f"Unknown allocation {allocation!r}: use 'equal' or 'active'")
+
+    index, columns = closes.index, closes.columns
+    return PortfolioResult(
+        pd.Series(equity, index=index, name='equity'),
+        pd.DataFrame(asset_equity, index=index, columns=columns),
+        pd.DataFrame(positions, index=index, columns=columns),
+        pd.DataFrame(weights, index=index, columns=columns),
+        pd.Series(turnover, index=index, name='turnover'),
+    )
+
+def _active_allocation(prices, positions, returns, initial_balance, fee_rate, max_weight):
+    n_bars, n_symbols = positions.shape
+
+    # Rebalances happen on the bars where the set of long symbols changes; a segment runs
+    # from one rebalance to the bar before the next
+    changed = np.zeros(n_bars, dtype=bool)
+    changed[0] = True
+    changed[1:] = np.any(positions[1:] != positions[:-1], axis=1)
+    starts = np.flatnonzero(changed)
+    segment = np.cumsum(changed) - 1  # Segment of each bar
+
+    n_long = positions[starts].sum(axis=1, keepdims=True)
+    targets = positions[starts] / np.maximum(n_long, 1)
+    if max_weight is not None:
+        targets = np.minimum(targets, max_weight)
+    cash_weight = 1 - targets.sum(axis=1)
+
+    # Price growth of every symbol since its segment started, from one cumulative product
+    growth = np.cumprod(1 + returns, axis=0)
+    since_start = growth / growth[starts][segment]
+
+    # Each segment's value growth up to the next rebalance, and the weights it drifted to
+    ends = np.append(starts[1:], n_bars - 1)
+    end_growth = growth[ends] / growth[starts]
+    segment_growth = cash_weight + (targets * end_growth).sum(axis=1)
+    drifted = targets * end_growth / segment_growth[:, None]
+
+    # Fees on the value traded to get from the drifted weights back to the targets
+    previous = np.zeros_like(targets)
+    previous[1:] = drifted[:-1]
+    segment_turnover = np.abs(targets - previous).sum(axis=1)
+    start_value = initial_balance * np.cumprod(
+        np.concatenate(([1.0], segment_growth[:-1])) * (1 - fee_rate * segment_turnover))
+
+    asset_equity = start_value[segment][:, None] * targets[segment] * since_start
+    equity = start_value[segment] * cash_weight[segment] + asset_equity.sum(axis=1)
+    weights = asset_equity / equity[:, None]
+    turnover = np.zeros(n_bars)
+    turnover[starts] = segment_turnover
+    return asset_equity, equity, weights, turnover
+
+# Function to summarize each symbol's part of a portfolio backtest
+def portfolio_summary(result, closes):
+    # Value held in each symbol going into every bar, times the bar's price move
+    held = result.weights.shift(1) * result.equity.shift(1).to_numpy()[:, None]
+    moves = closes.ffill().pct_change(fill_method=None).fillna(0.0)
+    return pd.DataFrame({
+        'Final Value': result.asset_equity.iloc[-1],
+        'Gross P&L': (held * moves).sum(),
+        'Trades': result.positions.diff().abs().sum().astype(int),
+        'Exposure %': result.positions.mean() * 100,
+    }).sort_values('Gross P&L', ascending=False)
+
+# Reference implementation of allocation='active': a per-bar loop over units and cash
+def loop_active_backtest(closes, positions, initial_balance=10000.0, fee_rate=0.001, max_weight=None):
+    prices = closes.ffill().fillna(0.0).to_numpy()
+    units = np.zeros(prices.shape[1])
+    cash = initial_balance
+    equity = np.empty(len(prices))
+    for t in range(len(prices)):
+        if t == 0 or np.any(positions[t] != positions[t - 1]):
+            value = cash + units @ prices[t]
+            targets = positions[t] / max(positions[t].sum(), 1)
+            if max_weight is not None:
+                targets = np.minimum(targets, max_weight)
+            holdings = units * prices[t]
+            traded = np.abs(targets * value - holdings).sum()
+            value -= fee_rate * traded
+            # Buy the targets out of the value left after fees
+            new_units = np.divide(targets * value, prices[t], out=np.zeros_like(units), where=prices[t] > 0)
+            cash = value - new_units @ prices[t]
+            units = new_units
+        equity[t] = cash + units @ prices[t]
+    return equity
+
+if __name__ == '__main__':
+    import time
+
+    from backtest_engine import crossover_backtest
+
+    # Synthetic year of hourly closes for 200 pairs, some listed part way through
+    rng = np.random.default_rng(0)
+    n_bars, n_symbols = 24 * 365, 200
+    index = pd.date_range('2024-01-01', periods=n_bars, freq='h')
+    prices = 100 * np.exp(np.cumsum(rng.normal(0, 0.01, (n_bars, n_symbols)), axis=0))
+    for j in range(0, n_symbols, 10):
+        prices[:rng.integers(1, n_bars // 2), j] = np.nan
+    closes = pd.DataFrame(prices, index=index, columns=[f'SYM{j}USDT' for j in range(n_symbols)])
+
+    # 'equal' sleeves without fees are crossover_backtest side by side
+    result = portfolio_backtest(closes.iloc[:, :20], 7, 25, fee_rate=0.0, initial_balance=20 * 1000.0)
+    for symbol in result.asset_equity.columns[:20]:
+        close = closes[symbol].dropna()
+        short_ema = close.ewm(span=7, adjust=False).mean()
+        long_ema = close.ewm(span=25, adjust=False).mean()
+        expected = crossover_backtest(close.to_numpy(), short_ema.to_numpy(), long_ema.to_numpy())
+        assert np.allclose(result.asset_equity[symbol].loc[close.index], expected.equity, rtol=1e-9), symbol
+
+    # 'active' matches the per-bar loop, fees included
+    subset = closes.iloc[:2000, :30]
+    for max_weight in (None, 0.2):
+        result = portfolio_backtest(subset, 7, 25, allocation='active', max_weight=max_weight)
+        expected = loop_active_backtest(subset, result.positions.to_numpy(), max_weight=max_weight)
+        assert np.allclose(result.equity.to_numpy(), expected, rtol=1e-9)
+    print("Portfolio backtest matches crossover_backtest and the per-bar loop")
+
+    for allocation in ('equal', 'active'):
+        start = time.perf_counter()
+        result = portfolio_backtest(closes, 50, 200, allocation=allocation)
+        elapsed = time.perf_counter() - start
+        print(f"{allocation}: {n_symbols} pairs x {n_bars:,} bars in {elapsed:.2f}s, "
+              f"final equity {result.equity.iloc[-1]:,.2f}, mean turnover {result.turnover.mean():.4f}")
+    print(portfolio_summary(result, closes).head().to_string())
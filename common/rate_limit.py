@@ -0,0 +1,108 @@
+import asyncio
+import threading
+import time
+from collections import deque
+
+from intervals import interval_ms, to_ms
+from metrics import registry
+
+# Request weight of the Binance REST endpoints the scripts use (anything else counts as 1)
+ENDPOINT_WEIGHTS = {
+    'get_exchange_info': 20,
+    'get_account': 20,
+    'get_klines': 2,
+    'get_historical_klines': 2,  # Per page: python-binance requests long ranges 1000 candles at a time
+    'get_symbol_ticker': 2,
+    'order_market_buy': 1,
+    'order_market_sell': 1,
+}
+
+# Candles per request when python-binance pages through get_historical_klines
+KLINES_PER_PAGE = 1000
+
+# Function to estimate how many requests a get_historical_klines call pages through
+def historical_kline_pages(symbol=None, interval=None, start_str=None, end_str=None, limit=None, **kwargs):
+    """
+    Without a start, the call returns the latest `limit` candles (one page for the usual
+    1000). With one, the range from start to end (default now) is split into pages of
+    KLINES_PER_PAGE candles. A start that cannot be read here (e.g. "1 day ago UTC")
+    counts as one page.
+    """
+    if start_str is None:
+        return max(1, -(-(limit or KLINES_PER_PAGE) // KLINES_PER_PAGE))
+    try:
+        start_ms = to_ms(start_str)
+        end_ms = int(time.time() * 1000) if end_str is None else to_ms(end_str)
+        bar_ms = interval_ms(interval)
+    except (ValueError, TypeError, KeyError):
+        return 1
+    return max(1, -(-(end_ms - start_ms) // (bar_ms * KLINES_PER_PAGE)))
+
+# Binance allows 6000 request weight per minute per IP; leave headroom for anything else
+DEFAULT_MAX_WEIGHT = 4800
+
+class WeightRateLimiter:
+    """
+    Sliding-window limiter on request weight, shared by every thread (and the event loop)
+    that talks to the exchange. acquire() blocks until the weight fits in the window.
+    """
+
+    def __init__(self, max_weight=DEFAULT_MAX_WEIGHT, period=60.0):
+        self.max_weight = max_weight
+        self.period = period
+        self.used = deque()  # (timestamp, weight)
+        self.used_weight = 0
+        self.lock = threading.Lock()
+
+    # Function to reserve weight now, or return how long to wait before trying again
+    def _try_acquire(self, weight):
+        with self.lock:
+            now = time.monotonic()
+            while self.used and now - self.used[0][0] >= self.period:
+                self.used_weight -= self.used.popleft()[1]
+            if self.used_weight + weight <= self.max_weight or not self.used:
+                self.used.append((now, weight))
+                self.used_weight += weight
+                return 0.0
+            return self.period - (now - self.used[0][0])
+
+    def acquire(self, weight=1):
+        while True:
+            wait = self._try_acquire(weight)
+            if wait <= 0:
+                return
+            time.sleep(wait)
+
+    async def acquire_async(self, weight=1):
+        while True:
+            wait = self._try_acquire(weight)
+            if wait <= 0:
+                return
+            await asyncio.sleep(wait)
+
+class RateLimitedClient:
+    """
+    Wraps a binance Client so every call first takes its weight from a shared limiter.
+    Anything that is not a method (constants, attributes) is passed straight through.
+    """
+
+    def __init__(self, client, limiter=None):
+        self.client = client
+        self.limiter = limiter or WeightRateLimiter()
+
+    def __getattr__(self, name):
+        attr = getattr(self.client, name)
+        if not callable(attr):
+            return attr
+
+        def call(*args, **kwargs):
+            weight = ENDPOINT_WEIGHTS.get(name, 1)
+            # A paginated download takes every page's weight, one page at a time
+            pages = historical_kline_pages(*args, **kwargs) if name == 'get_historical_klines' else 1
+            with registry.timer('rate_limit_wait', endpoint=name):
+                for _ in range(pages):
+                    self.limiter.acquire(weight)
+            registry.inc('api_weight_used_total', weight * pages, endpoint=name)
+            with registry.timer('api_call', endpoint=name):
+                return attr(*args, **kwargs)
+        return call
@@ -0,0 +1,205 @@
+import numpy as np
+import pandas as pd
+from collections import namedtuple
+
+from candle_store import CandleStore
+from ema_bot import SymbolBot
+from sim_client import SimulatedClient, scratch_store
+
+# Result of a replay: the equity curve (quote asset, per candle), the filled orders,
+# and the bot and simulated client as they stand after the last candle
+ReplayResult = namedtuple('ReplayResult', ['equity', 'orders', 'bot', 'client'])
+
+# Function to replay recorded candles through the live bot's own decision code
+def replay_backtest(candle_store, symbol, interval='1h', start_ms=None, end_ms=None, usdt_balance=10000.0,
+                    max_usdt=10000, fee_rate=0.001, slippage=0.0005, warmup=100, fast=True, bot_options=None,
+                    fee_asset='quote'):
+    """
+    Backtests the strategy EMABot-FINAL.py actually trades: a SymbolBot (trend flip,
+    1% fee reserve, lot-size rounding, max_usdt cap) trading against a SimulatedClient
+    that serves the stored candles, one closed candle at a time as trade_on_close sees
+    them. The bot starts at start_ms (by default after `warmup` candles) with the usual
+    initialize() and initial correction.
+
+    fast=False is the event-driven replay: the clock moves to every candle, the bot's
+    EMAs are updated and act_on_trend() is called each time. fast=True gives the same
+    trades: the EMAs and trend are computed for every candle at once, and the clock
+    only stops on candles where the trend flips (act_on_trend does nothing on the
+    others), so millions of candles replay in seconds.
+
+    fee_asset='received' charges the fees as Binance does without BNB (a BUY's fee comes
+    out of the coin bought); the default takes every fee from the quote asset.
+    """
+    client = SimulatedClient(candle_store, balances={'USDT': usdt_balance}, fee_rate=fee_rate, slippage=slippage,
+                             symbols=[symbol], fee_asset=fee_asset)
+    # The bot's own candle store is a scratch folder, removed once the replay is done
+    with scratch_store() as bot_store:
+        bot = SymbolBot(client, symbol, max_usdt=max_usdt, interval=interval, notify=None, candle_store=bot_store,
+                        **(bot_options or {}))
+        return _replay(bot, client, symbol, interval, start_ms, end_ms, usdt_balance, warmup, fast)
+
+# Function to run the replay for a bot set up by replay_backtest
+def _replay(bot, client, symbol, interval, start_ms, end_ms, usdt_balance, warmup, fast):
+    records = client._records(symbol, interval)
+    close_times = records['close_time']
+    closes = records['close'].astype(np.float64)
+    if end_ms is not None:
+        stop = np.searchsorted(close_times, end_ms, side='right')
+        close_times, closes = close_times[:stop], closes[:stop]
+    first = np.searchsorted(close_times, start_ms) if start_ms is not None else min(warmup, len(closes) - 1)
+    if first < 0 or first >= len(closes):
+        return ReplayResult(pd.Series(dtype=float), [], bot, client)
+
+    # Start-up exactly as live: trend from the history, then the initial correction
+    client.set_time(close_times[first])
+    bot.initialize(usdt_balance)
+
+    short_ema = bot.emas[str(bot.short_period)]
+    long_ema = bot.emas[str(bot.long_period)]
+    short_ema.seed(closes[:first + 1], close_times[:first + 1])
+    long_ema.seed(closes[:first + 1], close_times[:first + 1])
+
+    if fast:
+        _replay_flips(bot, client, short_ema, long_ema, closes, close_times, first)
+    else:
+        for i in range(first + 1, len(closes)):
+            client.set_time(close_times[i])
+            bot.act_on_trend(short_ema.update(closes[i], close_times[i]), long_ema.update(closes[i], close_times[i]),
+                             closes[i])
+
+    equity = equity_curve(client.orders, closes[first:], close_times[first:], usdt_balance, client.quote_asset)
+    return ReplayResult(equity, client.orders, bot, client)
+
+# Function to call act_on_trend only on the candles where the signal trend flips
+def _replay_flips(bot, client, short_ema, long_ema, closes, close_times, first):
+    short_values = pd.Series(closes).ewm(span=short_ema.period, adjust=False).mean().to_numpy()
+    long_values = pd.Series(closes).ewm(span=long_ema.period, adjust=False).mean().to_numpy()
+    bullish = short_values > long_values
+
+    # The first candle after start-up always checks (the start-up trend comes from other EMAs)
+    flips = np.flatnonzero(bullish[first + 2:] != bullish[first + 1:-1]) + first + 2
+    if first + 1 < len(closes):
+        flips = np.concatenate(([first + 1], flips))
+    for i in flips:
+        client.set_time(close_times[i])
+        bot.act_on_trend(short_values[i], long_values[i], closes[i])
+
+    # Leave the bot's EMAs where the event-driven replay would have
+    if len(closes) > first + 1:
+        for ema, values in ((short_ema, short_values), (long_ema, long_values)):
+            ema.value, ema.previous, ema.last_time = float(values[-1]), float(values[-2]), int(close_times[-1])
+
+# Function to rebuild the account's equity at every candle from the filled orders
+def equity_curve(orders, closes, close_times, initial_quote, quote_asset='USDT'):
+    quote_change = np.zeros(len(closes))
+    base_change = np.zeros(len(closes))
+    for order in orders:
+        i = np.searchsorted(close_times, order['transactTime'])
+        quantity = float(order['executedQty'])
+        value = float(order['cummulativeQuoteQty'])
+        if order['side'] == 'BUY':
+            quote_change[i] -= value
+            base_change[i] += quantity
+        else:
+            quote_change[i] += value
+            base_change[i] -= quantity
+        # Fees come out of whichever asset they were charged in
+        for fill in order['fills']:
+            if fill['commissionAsset'] == quote_asset:
+                quote_change[i] -= float(fill['commission'])
+            else:
+                base_change[i] -= float(fill['commission'])
+    equity = initial_quote + np.cumsum(quote_change) + np.cumsum(base_change) * closes
+    return pd.Series(equity, index=pd.to_datetime(close_times, unit='ms'), name='equity')
+
+# Reference for the self-check: the bot's sizing rules and the simulator's fill prices and fees,
+# walked candle by candle with plain cash and units
+def reference_equity(closes, first, usdt_balance=10000.0, max_usdt=10000, fee_rate=0.001, slippage=0.0005,
+                     step_size=1e-5, short_period=1, long_period=7, trend_short_period=7, trend_long_period=25,
+                     fee_asset='quote'):
+    from ema_bot import adjust_quantity_to_lot_size
+    series = pd.Series(closes)
+    ema = lambda period: series.ewm(span=period, adjust=False).mean().to_numpy()
+    lot_size = {'stepSize': step_size}
+    # units is what the account holds; bought is what the last buy delivered, all the bot sells
+    # (a fee taken in the coin leaves less than a lot step behind after each sale)
+    cash, units, bought, held, orders = usdt_balance, 0.0, 0.0, False, 0
+
+    def buy(price, spend):
+        nonlocal cash, units, bought, held, orders
+        quantity = adjust_quantity_to_lot_size(spend / price, lot_size)
+        if fee_asset == 'received':
+            cash -= quantity * price * (1 + slippage)
+            bought = quantity * (1 - fee_rate)
+        else:
+            cash -= quantity * price * (1 + slippage) * (1 + fee_rate)
+            bought = quantity
+        units += bought
+        held, orders = True, orders + 1
+
+    def sell(price):
+        nonlocal cash, units, held, orders
+        quantity = adjust_quantity_to_lot_size(bought, lot_size)
+        cash += quantity * price * (1 - slippage) * (1 - fee_rate)
+        units -= quantity
+        held, orders = False, orders + 1
+
+    trend = 'bullish' if ema(trend_short_period)[first] > ema(trend_long_period)[first] else 'bearish'
+    if trend == 'bullish':
+        buy(closes[first], cash * 0.99)
+    short_values, long_values = ema(short_period), ema(long_period)
+    for i in range(first + 1, len(closes)):
+        current = 'bullish' if short_values[i] > long_values[i] else 'bearish'
+        if current == 'bullish' and trend != 'bullish' and cash > 0:
+            buy(closes[i], (cash if held else min(cash, max_usdt)) * 0.99)
+        elif current == 'bearish' and trend != 'bearish' and held:
+            sell(closes[i])
+        trend = current
+    return cash + units * closes[-1], orders
+
+if __name__ == '__main__':
+    # Check the fast path gives the same orders as the event-driven replay on synthetic candles,
+    # and that both keep trading to the end with the account the simulator actually holds
+    import contextlib
+    import io
+    import tempfile
+    import time
+    from candle_store import KLINE_DTYPE
+
+    rng = np.random.default_rng(0)
+    n_bars = 20_000
+    closes = 100 * np.exp(np.cumsum(rng.normal(0, 0.01, n_bars)))
+    records = np.zeros(n_bars, dtype=KLINE_DTYPE)
+    records['timestamp'] = 1_600_000_000_000 + np.arange(n_bars) * 3_600_000
+    records['close_time'] = records['timestamp'] + 3_599_999
+    records['open'] = records['high'] = records['low'] = records['close'] = closes
+    results = {}
+    with tempfile.TemporaryDirectory() as root:
+        store = CandleStore(root)
+        store.write('BTCUSDT', '1h', records)
+        for fast, fee_asset in ((False, 'quote'), (True, 'quote'), (True, 'received')):
+            start = time.perf_counter()
+            log = io.StringIO()
+            with contextlib.redirect_stdout(log):
+                results[fast, fee_asset] = result = replay_backtest(store, 'BTCUSDT', fast=fast, fee_asset=fee_asset)
+            print(f"fast={fast}, fees in {fee_asset} asset: {n_bars / (time.perf_counter() - start):,.0f} candles/s, "
+                  f"{len(result.orders)} orders")
+            assert 'code=-2010' not in log.getvalue(), "an order was rejected for insufficient balance"
+            # Value what the simulator holds (coin dust left by fees included) at the last candle
+            result.client.set_time(records['close_time'][-1])
+            assert np.isclose(result.equity.iloc[-1], result.client.equity(), rtol=1e-6)
+
+    def trades(result):
+        return [(o['transactTime'], o['side'], o['executedQty']) for o in result.orders]
+    assert trades(results[False, 'quote']) == trades(results[True, 'quote'])
+    assert np.allclose(results[False, 'quote'].equity, results[True, 'quote'].equity)
+
+    # Every trend flip to the end of the run is traded, at the fee- and slippage-aware fills,
+    # whichever asset the fees are taken from
+    for fee_asset in ('quote', 'received'):
+        result = results[True, fee_asset]
+        expected_equity, expected_orders = reference_equity(closes, 100, fee_asset=fee_asset)
+        assert len(result.orders) == expected_orders > 1000
+        assert np.isclose(result.equity.iloc[-1], expected_equity, rtol=1e-6)
+        print(f"Fees in {fee_asset} asset: same orders; final equity {result.equity.iloc[-1]:.2f} "
+              f"(reference {expected_equity:.2f})")
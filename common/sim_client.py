@@ -0,0 +1,276 @@
+import numpy as np
+import pandas as pd
+import contextlib
+import os
+import tempfile
+import time
+
+from bot_runner import BalanceAllocator
+from candle_store import CandleStore
+from intervals import interval_ms, to_ms
+
+# Default trading rules for simulated symbols (strings, like get_exchange_info returns them)
+DEFAULT_FILTERS = {
+    'LOT_SIZE': {'filterType': 'LOT_SIZE', 'minQty': '0.00001000', 'maxQty': '9000.00000000', 'stepSize': '0.00001000'},
+    'PRICE_FILTER': {'filterType': 'PRICE_FILTER', 'minPrice': '0.01000000', 'maxPrice': '1000000.00000000', 'tickSize': '0.01000000'},
+    'NOTIONAL': {'filterType': 'NOTIONAL', 'minNotional': '5.00000000'},
+}
+
+class SimulatedAPIError(Exception):
+    """Stand-in for BinanceAPIException: carries the Binance error code and message."""
+
+    def __init__(self, code, message):
+        super().__init__(f"APIError(code={code}): {message}")
+        self.code = code
+        self.message = message
+
+class SimulatedClient:
+    """
+    Offline drop-in for binance.client.Client, for replaying recorded candles through the
+    bot. Klines come from a CandleStore, and only candles closed by the simulated clock
+    (set_time) are visible, so the bot never sees the future. Market orders fill at the
+    last close moved against the order by `slippage`, pay `fee_rate` of their value and
+    update the simulated balances. fee_asset='quote' takes every fee from the quote asset;
+    fee_asset='received' takes it from the asset the order receives, as Binance does
+    without BNB fees: a BUY gets `fee_rate` less of the coin than its executedQty.
+    Orders are checked against the LOT_SIZE and NOTIONAL filters and rejected with the
+    same error codes as Binance. `latency` (seconds) is slept on every call, for load
+    testing; leave it at 0 to replay as fast as possible.
+    """
+
+    def __init__(self, candle_store, balances=None, fee_rate=0.001, slippage=0.0005, latency=0.0,
+                 quote_asset='USDT', symbols=None, filters=None, fee_asset='quote'):
+        self.candle_store = candle_store
+        self.balances = {asset: float(amount) for asset, amount in (balances or {quote_asset: 10000.0}).items()}
+        self.fee_rate = fee_rate
+        self.fee_asset = fee_asset
+        self.slippage = slippage
+        self.latency = latency
+        self.quote_asset = quote_asset
+        self.symbols = symbols
+        self.filters = filters or {}  # symbol -> {filterType: filter} overriding DEFAULT_FILTERS
+        self.now_ms = None
+        self.orders = []
+        self.candles = {}
+        self.intervals = {}
+
+    # Function to move the simulated clock (ms); candles closed by then become visible
+    def set_time(self, now_ms):
+        self.now_ms = int(now_ms)
+
+    def _records(self, symbol, interval):
+        key = (symbol, interval)
+        if key not in self.candles:
+            self.candles[key] = np.asarray(self.candle_store.read(symbol, interval))
+        return self.candles[key]
+
+    # Function to get the candles closed by the simulated clock
+    def _closed(self, symbol, interval):
+        records = self._records(symbol, interval)
+        if self.now_ms is None:
+            return records
+        return records[:np.searchsorted(records['close_time'], self.now_ms, side='right')]
+
+    # Function to list the close times of the recorded candles, for driving the clock
+    def close_times(self, symbol, interval):
+        return self._records(symbol, interval)['close_time']
+
+    def _wait(self):
+        if self.latency:
+            time.sleep(self.latency)
+
+    def _last_price(self, symbol):
+        for interval in self._intervals(symbol):
+            closed = self._closed(symbol, interval)
+            if len(closed):
+                return float(closed['close'][-1])
+        raise SimulatedAPIError(-1121, 'Invalid symbol.')
+
+    # Function to list the recorded intervals of a symbol, shortest bars first
+    def _intervals(self, symbol):
+        if symbol not in self.intervals:
+            folder = os.path.join(self.candle_store.root, symbol)
+            names = os.listdir(folder) if os.path.isdir(folder) else []
+            intervals = [name[:-4] for name in names if name.endswith('.bin')]
+            self.intervals[symbol] = sorted(intervals, key=interval_ms)
+        return self.intervals[symbol]
+
+    def _symbol_filters(self, symbol):
+        filters = dict(DEFAULT_FILTERS)
+        filters.update(self.filters.get(symbol, {}))
+        return filters
+
+    # Market data
+    def get_klines(self, symbol, interval, limit=500, startTime=None, endTime=None):
+        self._wait()
+        records = self._closed(symbol, interval)
+        if startTime is not None:
+            records = records[records['timestamp'] >= int(startTime)]
+        if endTime is not None:
+            records = records[records['timestamp'] <= int(endTime)]
+        records = records[:limit] if startTime is not None else records[-limit:]
+        return _to_klines(records)
+
+    def get_historical_klines(self, symbol, interval, start_str=None, end_str=None, limit=None):
+        self._wait()
+        records = self._closed(symbol, interval)
+        if start_str is not None:
+            records = records[records['timestamp'] >= to_ms(start_str)]
+        if end_str is not None:
+            records = records[records['timestamp'] <= to_ms(end_str)]
+        if start_str is None:
+            records = records[-(limit or 1000):]
+        return _to_klines(records)
+
+    def get_symbol_ticker(self, symbol):
+        self._wait()
+        return {'symbol': symbol, 'price': f"{self._last_price(symbol):.8f}"}
+
+    def get_exchange_info(self):
+        self._wait()
+        symbols = self.symbols
+        if symbols is None:
+            root = self.candle_store.root
+            symbols = sorted(os.listdir(root)) if os.path.isdir(root) else []
+        return {'symbols': [
+            {
+                'symbol': symbol,
+                'status': 'TRADING',
+                'baseAsset': symbol[:-len(self.quote_asset)],
+                'quoteAsset': self.quote_asset,
+                'filters': list(self._symbol_filters(symbol).values()),
+            }
+            for symbol in symbols
+        ]}
+
+    # Account
+    def get_account(self):
+        self._wait()
+        return {'balances': [{'asset': asset, 'free': f"{free:.8f}", 'locked': '0.00000000'}
+                             for asset, free in self.balances.items()]}
+
+    def get_asset_balance(self, asset):
+        self._wait()
+        return {'asset': asset, 'free': f"{self.balances.get(asset, 0.0):.8f}", 'locked': '0.00000000'}
+
+    # Function to value every balance in the quote asset at the last closes
+    def equity(self):
+        total = 0.0
+        for asset, amount in self.balances.items():
+            if asset == self.quote_asset:
+                total += amount
+            elif amount:
+                total += amount * self._last_price(asset + self.quote_asset)
+        return total
+
+    # Orders
+    def order_market_buy(self, symbol, quantity, **params):
+        return self.create_order(symbol=symbol, side='BUY', type='MARKET', quantity=quantity, **params)
+
+    def order_market_sell(self, symbol, quantity, **params):
+        return self.create_order(symbol=symbol, side='SELL', type='MARKET', quantity=quantity, **params)
+
+    def create_order(self, symbol, side, type='MARKET', quantity=None, **params):
+        self._wait()
+        if type != 'MARKET':
+            raise SimulatedAPIError(-1116, 'Invalid orderType.')
+        quantity = float(quantity)
+        base_asset = symbol[:-len(self.quote_asset)]
+        self._check_filters(symbol, quantity)
+
+        last_price = self._last_price(symbol)
+        price = last_price * (1 + self.slippage) if side == 'BUY' else last_price * (1 - self.slippage)
+        value = quantity * price
+        commission = value * self.fee_rate
+        commission_asset = self.quote_asset
+
+        if side == 'BUY':
+            if self.fee_asset == 'received':
+                # The fee is kept back from the coin bought
+                commission, commission_asset = quantity * self.fee_rate, base_asset
+            quote_cost = value + (commission if commission_asset == self.quote_asset else 0.0)
+            if self.balances.get(self.quote_asset, 0.0) < quote_cost:
+                raise SimulatedAPIError(-2010, 'Account has insufficient balance for requested action.')
+            self.balances[self.quote_asset] -= quote_cost
+            self.balances[base_asset] = self.balances.get(base_asset, 0.0) + quantity - (
+                commission if commission_asset == base_asset else 0.0)
+        else:
+            if self.balances.get(base_asset, 0.0) < quantity - 1e-12:
+                raise SimulatedAPIError(-2010, 'Account has insufficient balance for requested action.')
+            self.balances[base_asset] = max(0.0, self.balances.get(base_asset, 0.0) - quantity)
+            self.balances[self.quote_asset] = self.balances.get(self.quote_asset, 0.0) + value - commission
+
+        order = {
+            'symbol': symbol,
+            'orderId': len(self.orders) + 1,
+            'transactTime': self.now_ms,
+            'side': side,
+            'type': 'MARKET',
+            'status': 'FILLED',
+            'origQty': f"{quantity:.8f}",
+            'executedQty': f"{quantity:.8f}",
+            'cummulativeQuoteQty': f"{value:.8f}",
+            'fills': [{'price': f"{price:.8f}", 'qty': f"{quantity:.8f}",
+                       'commission': f"{commission:.8f}", 'commissionAsset': commission_asset}],
+        }
+        self.orders.append(order)
+        return order
+
+    # Function to reject orders the exchange would reject (Binance code -1013)
+    def _check_filters(self, symbol, quantity):
+        filters = self._symbol_filters(symbol)
+        lot_size = filters.get('LOT_SIZE')
+        if lot_size:
+            step_size = float(lot_size['stepSize'])
+            steps = quantity / step_size if step_size else 0
+            if (quantity < float(lot_size['minQty']) or quantity > float(lot_size['maxQty'])
+                    or (step_size and abs(steps - round(steps)) > 1e-6)):
+                raise SimulatedAPIError(-1013, 'Filter failure: LOT_SIZE')
+        notional = filters.get('NOTIONAL') or filters.get('MIN_NOTIONAL')
+        if notional and quantity * self._last_price(symbol) < float(notional['minNotional']):
+            raise SimulatedAPIError(-1013, 'Filter failure: NOTIONAL')
+
+# Function to turn candle records into REST kline lists (record_to_list for many rows at once)
+def _to_klines(records):
+    return [list(row) + ['0'] for row in records.tolist()]
+
+# Function to replay recorded candles through the bots' real trade() logic
+def run_simulation(client, bots, start_ms=None, end_ms=None, warmup=100):
+    """
+    Steps the SimulatedClient's clock through every recorded candle close of the bots'
+    symbols between start_ms and end_ms (by default from the `warmup`-th candle, so the
+    trend EMAs have history), calling each bot's trade() once per close. The bots must
+    trade through `client` and keep their own candle store (a separate folder, not the
+    recorded store the client reads from). The client's quote balance is split between
+    the bots with a BalanceAllocator, as MultiSymbolRunner does. Returns the equity
+    curve as a Series indexed by candle close time.
+    """
+    times = np.unique(np.concatenate([client.close_times(bot.symbol, bot.interval) for bot in bots]))
+    if start_ms is None:
+        start_ms = times[min(warmup, len(times) - 1)]
+    times = times[times >= start_ms]
+    if end_ms is not None:
+        times = times[times <= end_ms]
+    if not len(times):
+        return pd.Series(dtype=float)
+
+    client.set_time(times[0])
+    allocator = BalanceAllocator(client.balances.get(client.quote_asset, 0.0))
+    account_info = client.get_account()
+    for bot in bots:
+        bot.initialize(allocator.allocate(bot.symbol, bot.state['max_usdt']), account_info)
+
+    equity = np.empty(len(times))
+    equity[0] = client.equity()
+    for i in range(1, len(times)):
+        client.set_time(times[i])
+        for bot in bots:
+            bot.trade()
+        equity[i] = client.equity()
+    return pd.Series(equity, index=pd.to_datetime(times, unit='ms'), name='equity')
+
+# Function to make a throwaway candle store for simulated bots; its folder is removed when the block exits
+@contextlib.contextmanager
+def scratch_store():
+    with tempfile.TemporaryDirectory(prefix='sim_candles_') as root:
+        yield CandleStore(root)
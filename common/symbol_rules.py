@@ -0,0 +1,68 @@
+import threading
+import time
+
+# Function to tell whether an order error was a rejection by one of the symbol filters
+def is_filter_rejection(error):
+    # Binance answers -1013 "Filter failure: LOT_SIZE" (or PRICE_FILTER, NOTIONAL, ...)
+    return getattr(error, 'code', None) == -1013 or 'Filter failure' in str(error)
+
+class SymbolRules:
+    """
+    Cache of the trading rules from get_exchange_info, indexed by symbol. The (heavy)
+    exchange info is downloaded once and refreshed after `ttl` seconds, or sooner when
+    invalidate() is called after an order is rejected by a filter.
+    """
+
+    def __init__(self, client, ttl=3600):
+        self.client = client
+        self.ttl = ttl
+        self.rules = {}
+        self.loaded_at = None
+        self.lock = threading.Lock()
+
+    # Function to download the exchange info and index each symbol's filters by type
+    def refresh(self):
+        exchange_info = self.client.get_exchange_info()
+        rules = {}
+        for s in exchange_info['symbols']:
+            rules[s['symbol']] = {f['filterType']: f for f in s['filters']}
+        self.rules = rules
+        self.loaded_at = time.monotonic()
+
+    def invalidate(self):
+        self.loaded_at = None
+
+    # Function to get a symbol's filters, refreshing the cache if it has expired
+    def filters(self, symbol):
+        with self.lock:
+            if self.loaded_at is None or time.monotonic() - self.loaded_at > self.ttl:
+                self.refresh()
+            return self.rules.get(symbol)
+
+    # Function to fetch LOT_SIZE filter details
+    def lot_size(self, symbol):
+        f = (self.filters(symbol) or {}).get('LOT_SIZE')
+        if f is None:
+            return None
+        return {
+            'minQty': float(f['minQty']),
+            'maxQty': float(f['maxQty']),
+            'stepSize': float(f['stepSize'])
+        }
+
+    # Function to fetch PRICE_FILTER details
+    def price_filter(self, symbol):
+        f = (self.filters(symbol) or {}).get('PRICE_FILTER')
+        if f is None:
+            return None
+        return {
+            'minPrice': float(f['minPrice']),
+            'maxPrice': float(f['maxPrice']),
+            'tickSize': float(f['tickSize'])
+        }
+
+    # Function to fetch the minimum order value (MIN_NOTIONAL, or NOTIONAL on newer symbols)
+    def min_notional(self, symbol):
+        filters = self.filters(symbol) or {}
+        f = filters.get('MIN_NOTIONAL') or filters.get('NOTIONAL')
+        return float(f['minNotional']) if f is not None else None
@@ -0,0 +1,122 @@
+import numpy as np
+import pandas as pd
+from collections import namedtuple
+
+from backtest_engine import crossover_backtest
+from ema_sweep import HOURLY_BARS_PER_YEAR, run_tasks, summarize
+from indicator_bank import ema_matrix
+
+# Result of a walk-forward run: one row per window (chosen periods, in- and out-of-sample
+# results) and the out-of-sample equity curve stitched across the test windows
+WalkForwardResult = namedtuple('WalkForwardResult', ['windows', 'equity'])
+
+# Function to split n bars into rolling (train_start, train_end, test_start, test_end) windows
+def walk_forward_windows(n_bars, train_bars, test_bars, step=None):
+    """
+    Each test window starts where its train window ends; windows move forward by `step`
+    bars (test_bars by default, so the test windows tile the history without overlap).
+    A larger step leaves gaps between the test windows; a smaller one would trade the
+    same bars twice, so it is rejected.
+    """
+    step = step or test_bars
+    if step < test_bars:
+        raise ValueError(f"step ({step}) must be at least test_bars ({test_bars}) so test windows do not overlap")
+    windows = []
+    start = 0
+    while start + train_bars + test_bars <= n_bars:
+        windows.append((start, start + train_bars, start + train_bars, start + train_bars + test_bars))
+        start += step
+    return windows
+
+# Function to run a walk-forward optimization of the EMA crossover periods for one symbol
+def walk_forward(symbol, close, short_periods, long_periods, train_bars, test_bars, step=None, index=None,
+                 metric='Total Return %', initial_balance=1000.0, workers=None,
+                 periods_per_year=HOURLY_BARS_PER_YEAR):
+    """
+    For every window, each short/long combination is backtested on the train bars (all
+    windows at once, in parallel) and the best one by `metric` is then run on the
+    following test bars, which it has not seen. The EMAs for each period are computed
+    once over the whole history and sliced for every window, instead of recomputed per
+    window. The test windows' equity curves are chained (each starts with the previous
+    one's final balance) into one out-of-sample curve. metric can be any sweep column,
+    e.g. 'Sharpe' or 'Calmar'; periods_per_year annualizes them (see analytics.bars_per_year).
+    """
+    close = np.asarray(close, dtype=np.float64)
+    index = np.arange(len(close)) if index is None else np.asarray(index)
+    windows = walk_forward_windows(len(close), train_bars, test_bars, step)
+    combos = [(s, l) for s in short_periods for l in long_periods if s < l]
+    if not windows or not combos:
+        return WalkForwardResult(pd.DataFrame(), pd.Series(dtype=float))
+
+    # In-sample: every (window, combination) in one pool, sharing the prices and EMA cache
+    tasks = [(symbol, s, l, train_start, train_end)
+             for train_start, train_end, _, _ in windows for s, l in combos]
+    train_results = run_tasks({symbol: close}, tasks, initial_balance, workers, periods_per_year)
+
+    # Best combination per window (a NaN metric, e.g. the Sharpe of a run without trades, never wins)
+    best_per_window = [max(train_results[w * len(combos):(w + 1) * len(combos)],
+                           key=lambda result: np.nan_to_num(result[metric], nan=-np.inf))
+                       for w in range(len(windows))]
+
+    # The EMAs of every chosen period, in one matrix over the whole history
+    periods = sorted({best[column] for best in best_per_window for column in ('Short EMA', 'Long EMA')})
+    emas = dict(zip(periods, ema_matrix(close, periods)))
+
+    # Out-of-sample: run each window's best combination on its test bars
+    rows = []
+    curves = []
+    dates = []
+    capital = initial_balance
+    for w, ((train_start, train_end, test_start, test_end), best) in enumerate(zip(windows, best_per_window)):
+        short_period, long_period = best['Short EMA'], best['Long EMA']
+
+        lo = max(test_start - 1, 0)  # One bar early so a crossover on the first test bar counts
+        test = crossover_backtest(close[lo:test_end], emas[short_period][lo:test_end], emas[long_period][lo:test_end],
+                                  initial_balance=initial_balance)
+        test_summary = summarize(test, initial_balance, periods_per_year)
+        curves.append(test.equity[test_start - lo:] / initial_balance * capital)
+        dates.append(index[test_start:test_end])
+        capital *= test.balance / initial_balance
+
+        rows.append({
+            'Window': w + 1,
+            'Train Start': index[train_start],
+            'Train End': index[train_end - 1],
+            'Test Start': index[test_start],
+            'Test End': index[test_end - 1],
+            'Short EMA': short_period,
+            'Long EMA': long_period,
+            f'Train {metric}': best[metric],
+            'Test Return %': test_summary['Total Return %'],
+            'Test Max Drawdown %': test_summary['Max Drawdown %'],
+            'Test Sharpe': test_summary['Sharpe'],
+            'Test Trades': test_summary['Trades'],
+        })
+
+    # Each test window's own dates, so a step longer than the test window leaves its gaps visible
+    equity = pd.Series(np.concatenate(curves), index=np.concatenate(dates), name='equity')
+    return WalkForwardResult(pd.DataFrame(rows), equity)
+
+if __name__ == '__main__':
+    import time
+
+    # Synthetic two years of hourly candles: 60-day train windows, 14-day test windows
+    rng = np.random.default_rng(0)
+    close = 100 * np.exp(np.cumsum(rng.normal(0, 0.01, 24 * 365 * 2)))
+    start = time.perf_counter()
+    result = walk_forward('SYMUSDT', close, range(5, 60, 5), range(20, 300, 20), train_bars=24 * 60, test_bars=24 * 14)
+    print(result.windows.head(10).to_string(index=False))
+    print(f"{len(result.windows)} windows in {time.perf_counter() - start:.2f}s, "
+          f"out-of-sample return {(result.equity.iloc[-1] / 1000 - 1) * 100:.2f}%")
+
+    # Gapped windows keep each test bar on its own date; overlapping ones are refused
+    index = pd.date_range('2024-01-01', periods=len(close), freq='h')
+    gapped = walk_forward('SYMUSDT', close[:24 * 200], [10], [40], 24 * 60, 24 * 14, step=24 * 21, index=index[:24 * 200])
+    assert len(gapped.equity) == len(gapped.windows) * 24 * 14
+    for _, window in gapped.windows.iterrows():
+        assert window['Test Start'] in gapped.equity.index and window['Test End'] in gapped.equity.index
+    try:
+        walk_forward_windows(len(close), 24 * 60, 24 * 14, step=24 * 7)
+        raise AssertionError("overlapping test windows were accepted")
+    except ValueError:
+        pass
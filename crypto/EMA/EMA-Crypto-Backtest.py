@@ -1,7 +1,21 @@
-import pandas as pd
-import matplotlib.pyplot as plt
 from binance.client import Client
-import numpy as np
+import argparse
+import os
+import sys
+
+# Shared helpers live in the top-level common/ folder
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', '..', 'common'))
+from analytics import bars_per_year, performance_metrics, print_metrics
+from backtest_engine import crossover_backtest
+from candle_store import CandleStore
+from charts import plot_price_chart
+from downloader import HistoryDownloader
+from ema_sweep import parse_periods, sweep
+from indicator_bank import bank
+from intervals import to_ms
+from portfolio_backtest import load_close_matrix, portfolio_backtest, portfolio_summary
+from replay_backtest import replay_backtest
+from walk_forward import walk_forward
 
 # Binance API keys (replace with actual keys if needed for fetching historical data)
 api_key = 'api-key-here'
@@ -10,85 +24,186 @@ api_secret = 'secret-key-here'
 # Initialize Binance client
 client = Client(api_key, api_secret)
 
+# Local candle store: only candles newer than the last stored one are fetched from Binance
+candle_store = CandleStore()
+offline = False  # Set by --offline to backtest against the recorded store only
+
 # Fetch historical OHLCV data (candles)
 def fetch_ohlcv(symbol, interval='1h', limit=1000):
-    candles = client.get_historical_klines(symbol, interval, limit=limit)
-    df = pd.DataFrame(candles, columns=['timestamp', 'open', 'high', 'low', 'close', 'volume', 'close_time', 'quote_asset_vol', 'number_of_trades', 'taker_buy_base_vol', 'taker_buy_quote_vol', 'ignore'])
-    df['timestamp'] = pd.to_datetime(df['timestamp'], unit='ms')
-    df.set_index('timestamp', inplace=True)
-    df['close'] = df['close'].astype(float)
-    return df
+    return candle_store.fetch_ohlcv(None if offline else client, symbol, interval, limit=limit)
 
-# Calculate EMA
-def calculate_ema(df, period):
-    return df['close'].ewm(span=period, adjust=False).mean()
+# Calculate EMAs: all the spans at once from the shared indicator bank (cached per symbol and last candle)
+def calculate_emas(df, symbol, periods, interval='1h'):
+    return bank.get(symbol, interval, df, periods)
 
 # Backtest function
-def backtest(symbol):
+def backtest(symbol, short_period=50, mid_period=100, long_period=200, chart_path=None):
     # Fetch data
     df = fetch_ohlcv(symbol)
 
     # Calculate EMAs
-    df['short_ema'] = calculate_ema(df, 50)
-    df['mid_ema'] = calculate_ema(df, 100)
-    df['long_ema'] = calculate_ema(df, 200)
+    df['short_ema'], df['mid_ema'], df['long_ema'] = calculate_emas(df, symbol, [short_period, mid_period, long_period])
 
     # Initialize variables for backtesting
     initial_balance = 1000.0  # Starting balance in USD
-    balance = initial_balance
-    position = 0  # Position in BTC
-    trade_log = []
-
-    for i in range(1, len(df)):
-        # Get current and previous EMA values
-        short_ema = df['short_ema'].iloc[i]
-        mid_ema = df['mid_ema'].iloc[i]
-        long_ema = df['long_ema'].iloc[i]
-        prev_short_ema = df['short_ema'].iloc[i - 1]
-        prev_long_ema = df['long_ema'].iloc[i - 1]
-
-        # Check for Buy Signal
-        if short_ema > long_ema and prev_short_ema <= prev_long_ema and position == 0:
-            position = balance / df['close'].iloc[i]  # Buy BTC with entire balance
-            balance = 0  # Set cash balance to zero
-            trade_log.append(('Buy', df.index[i], df['close'].iloc[i], position))
-            print(f"Buying at {df['close'].iloc[i]:.2f} on {df.index[i]}")
-
-        # Check for Sell Signal
-        elif short_ema < long_ema and prev_short_ema >= prev_long_ema and position > 0:
-            balance = position * df['close'].iloc[i]  # Sell BTC for USD
-            position = 0  # Set BTC position to zero
-            trade_log.append(('Sell', df.index[i], df['close'].iloc[i], balance))
-            print(f"Selling at {df['close'].iloc[i]:.2f} on {df.index[i]}")
-
-    # Final portfolio value if position is held
-    if position > 0:
-        balance = position * df['close'].iloc[-1]
-        trade_log.append(('Final Sell', df.index[-1], df['close'].iloc[-1], balance))
+
+    # Run the crossover backtest over NumPy arrays instead of walking the DataFrame bar by bar
+    result = crossover_backtest(df['close'].to_numpy(), df['short_ema'].to_numpy(), df['long_ema'].to_numpy(),
+                                index=df.index, initial_balance=initial_balance)
+    trade_log = result.trade_log
+    balance = result.balance
+
+    for action, date, price, _ in trade_log:
+        if action == 'Buy':
+            print(f"Buying at {price:.2f} on {date}")
+        elif action == 'Sell':
+            print(f"Selling at {price:.2f} on {date}")
 
     # Calculate performance
     total_return = (balance - initial_balance) / initial_balance * 100
     print(f"\nInitial Balance: ${initial_balance:.2f}")
     print(f"Final Balance: ${balance:.2f}")
     print(f"Total Return: {total_return:.2f}%")
-
-    # Plotting the backtest results
-    plt.figure(figsize=(14, 8))
-    plt.plot(df['close'], label='Close Price', color='blue', alpha=0.5)
-    plt.plot(df['short_ema'], label='50-period EMA', color='green', linestyle='--')
-    plt.plot(df['mid_ema'], label='100-period EMA', color='orange', linestyle='--')
-    plt.plot(df['long_ema'], label='200-period EMA', color='red', linestyle='--')
-
-    # Plot buy/sell markers
-    for action, date, price, _ in trade_log:
-        color = 'green' if action == 'Buy' else 'red'
-        plt.scatter(date, price, color=color, marker='^' if action == 'Buy' else 'v', s=100, label=f"{action} @ ${price:.2f}")
-
-    plt.title(f"Backtest Results for {symbol}")
-    plt.xlabel("Date")
-    plt.ylabel("Price (USDT)")
-    plt.legend()
-    plt.show()
+    print_metrics(performance_metrics(result.equity, bars_per_year('1h'), result.in_position))
+
+    # Plotting the backtest results: the lines are downsampled to the chart width and the trades drawn as one
+    # marker set per side, so years of minute candles still plot quickly (chart_path saves it without a display)
+    plot_price_chart(df.index, [
+        (df['close'], {'label': 'Close Price', 'color': 'blue', 'alpha': 0.5}),
+        (df['short_ema'], {'label': f'{short_period}-period EMA', 'color': 'green', 'linestyle': '--'}),
+        (df['mid_ema'], {'label': f'{mid_period}-period EMA', 'color': 'orange', 'linestyle': '--'}),
+        (df['long_ema'], {'label': f'{long_period}-period EMA', 'color': 'red', 'linestyle': '--'}),
+    ], trades=trade_log, title=f"Backtest Results for {symbol}", path=chart_path)
+
+# Sweep mode: backtest every short/long EMA combination for each symbol and rank the results
+def run_sweep(symbols, short_periods, long_periods, workers=None, rank_by='Total Return %'):
+    # Load each symbol's candles once; the workers share them rather than refetching
+    closes = {symbol: fetch_ohlcv(symbol)['close'].to_numpy() for symbol in symbols}
+    results = sweep(closes, short_periods, long_periods, workers=workers, rank_by=rank_by)
+    print(results.head(20).to_string(index=False))
+    return results
+
+# Walk-forward mode: tune the periods on rolling train windows and score them on the unseen test windows
+def run_walk_forward(symbol, short_periods, long_periods, train_bars, test_bars, bars=5000, workers=None,
+                     metric='Total Return %'):
+    df = fetch_ohlcv(symbol, limit=bars)
+    result = walk_forward(symbol, df['close'].to_numpy(), short_periods, long_periods, train_bars, test_bars,
+                          index=df.index, metric=metric, workers=workers)
+    if result.windows.empty:
+        print(f"Not enough candles for a {train_bars} bar train window and a {test_bars} bar test window")
+        return result
+
+    print(result.windows.to_string(index=False))
+    equity = result.equity
+    print(f"\nOut-of-sample from {equity.index[0]} to {equity.index[-1]}: "
+          f"Final Balance: ${equity.iloc[-1]:.2f}, Total Return: {(equity.iloc[-1] / 1000.0 - 1) * 100:.2f}%")
+    print_metrics(performance_metrics(equity.to_numpy(), bars_per_year('1h')))
+    return result
+
+# Replay mode: backtest the EMABot-FINAL.py strategy with the bot's own trading code
+def run_replay(symbol, interval='1h', start=None, end=None, usdt_balance=10000.0):
+    if not offline:
+        fetch_ohlcv(symbol, interval)  # Bring the candle store up to date first
+    start_ms = to_ms(start) if start else None
+    end_ms = to_ms(end) if end else None
+    result = replay_backtest(candle_store, symbol, interval, start_ms=start_ms, end_ms=end_ms,
+                             usdt_balance=usdt_balance, max_usdt=usdt_balance)
+    equity = result.equity
+    if equity.empty:
+        print(f"No stored candles for {symbol} {interval} in that range")
+        return result
+
+    total_return = (equity.iloc[-1] / equity.iloc[0] - 1) * 100
+    print(f"\nReplayed {len(equity)} candles from {equity.index[0]} to {equity.index[-1]}")
+    print(f"Orders: {len(result.orders)}")
+    print(f"Initial Balance: ${equity.iloc[0]:.2f}")
+    print(f"Final Balance: ${equity.iloc[-1]:.2f}")
+    print(f"Total Return: {total_return:.2f}%")
+    print_metrics(performance_metrics(equity.to_numpy(), bars_per_year(interval)))
+    return result
+
+# Portfolio mode: run the crossover on every symbol at once from one shared balance
+def run_portfolio(symbols, interval='1h', short_period=50, long_period=200, allocation='equal', max_weight=None,
+                  start=None, end=None, usdt_balance=10000.0, chart_path=None):
+    if not offline:
+        for symbol in symbols:
+            fetch_ohlcv(symbol, interval)  # Bring the candle store up to date first
+    start_ms = to_ms(start) if start else None
+    end_ms = to_ms(end) if end else None
+    closes = load_close_matrix(candle_store, symbols, interval, start_ms, end_ms)
+    if closes.empty:
+        print(f"No stored {interval} candles for {', '.join(symbols)} in that range")
+        return None
+
+    result = portfolio_backtest(closes, short_period, long_period, allocation=allocation,
+                                initial_balance=usdt_balance, max_weight=max_weight)
+    equity = result.equity
+    print(portfolio_summary(result, closes).to_string())
+    print(f"\n{len(symbols)} symbols, {len(closes)} candles from {closes.index[0]} to {closes.index[-1]} ({allocation} allocation)")
+    print(f"Initial Balance: ${usdt_balance:.2f}")
+    print(f"Final Balance: ${equity.iloc[-1]:.2f}")
+    print(f"Total Return: {(equity.iloc[-1] / usdt_balance - 1) * 100:.2f}%")
+    # Turnover is the portfolio's traded value (rebalances included), not just the crossovers
+    print_metrics(performance_metrics(equity.to_numpy(), bars_per_year(interval), turnover=result.turnover.to_numpy()))
+    if chart_path:
+        plot_price_chart(equity.index, [(equity, {'label': 'Portfolio Equity', 'color': 'blue'})],
+                         title=f"{short_period}/{long_period} EMA Portfolio", ylabel='Equity (USDT)', path=chart_path)
+    return result
 
 # Run the backtest
-backtest('BTCUSDT')
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="EMA crossover backtest")
+    parser.add_argument('--sweep', action='store_true', help="Run a parameter sweep instead of a single backtest")
+    parser.add_argument('--symbols', nargs='+', default=['BTCUSDT'])
+    parser.add_argument('--short', default='5:100:5', help="Short EMA periods for the sweep, e.g. 5:100:5 or 7,25,50")
+    parser.add_argument('--long', default='20:300:10', help="Long EMA periods for the sweep, e.g. 20:300:10 or 100,200")
+    parser.add_argument('--rank-by', default='Total Return %',
+                        help="Sweep column to rank the sweep by and pick walk-forward periods with, e.g. Sharpe or Calmar")
+    parser.add_argument('--workers', type=int, default=None, help="Number of worker processes (default: all cores)")
+    parser.add_argument('--output', default=None, help="Optional CSV file to save the sweep, walk-forward or portfolio results to")
+    parser.add_argument('--chart', default=None, help="Save the backtest chart to a .png/.svg/.html file instead of showing it")
+    parser.add_argument('--download', default=None, metavar='START',
+                        help="First backfill the symbols' --interval candles from this date, in parallel (resumable)")
+    parser.add_argument('--download-workers', type=int, default=8, help="Parallel page requests for --download")
+    parser.add_argument('--offline', action='store_true', help="Use only the candles already in the local store")
+    parser.add_argument('--walk-forward', action='store_true', help="Walk-forward optimization of the sweep periods")
+    parser.add_argument('--train', type=int, default=24 * 60, help="Walk-forward train window in candles")
+    parser.add_argument('--test', type=int, default=24 * 14, help="Walk-forward test window in candles")
+    parser.add_argument('--bars', type=int, default=5000, help="Candles of history for the walk-forward run")
+    parser.add_argument('--portfolio', action='store_true', help="Backtest all --symbols together as one portfolio")
+    parser.add_argument('--ema', nargs=2, type=int, default=[50, 200], metavar=('SHORT', 'LONG'),
+                        help="Short and long EMA periods for the portfolio")
+    parser.add_argument('--allocation', choices=['equal', 'active'], default='equal',
+                        help="equal: fixed 1/N sleeve per symbol; active: equal weights across the symbols currently long")
+    parser.add_argument('--max-weight', type=float, default=None, help="Cap on any one symbol's weight (active allocation)")
+    parser.add_argument('--replay', action='store_true', help="Replay the live bot's strategy (EMABot-FINAL.py) instead")
+    parser.add_argument('--interval', default='1h', help="Candle interval for the replay, portfolio and --download")
+    parser.add_argument('--start', default=None, help="Replay and portfolio start date (replay default: after 100 warm-up candles)")
+    parser.add_argument('--end', default=None, help="Replay and --download end date (default: last stored candle / now)")
+    parser.add_argument('--balance', type=float, default=10000.0, help="Starting USDT balance for the replay and portfolio")
+    args = parser.parse_args()
+    offline = args.offline
+
+    if args.download:
+        HistoryDownloader(client, candle_store, workers=args.download_workers).download(
+            args.symbols, args.interval, args.download, args.end)
+
+    if args.portfolio:
+        result = run_portfolio(args.symbols, args.interval, args.ema[0], args.ema[1], args.allocation, args.max_weight,
+                               args.start, args.end, args.balance, args.chart)
+        if args.output and result is not None:
+            result.equity.to_csv(args.output)
+    elif args.replay:
+        run_replay(args.symbols[0], args.interval, args.start, args.end, args.balance)
+    elif args.walk_forward:
+        result = run_walk_forward(args.symbols[0], parse_periods(args.short), parse_periods(args.long),
+                                  args.train, args.test, args.bars, args.workers, args.rank_by)
+        if args.output:
+            result.windows.to_csv(args.output, index=False)
+            result.equity.to_csv(os.path.splitext(args.output)[0] + '_equity.csv')
+    elif args.sweep:
+        results = run_sweep(args.symbols, parse_periods(args.short), parse_periods(args.long), args.workers, args.rank_by)
+        if args.output:
+            results.to_csv(args.output, index=False)
+    else:
+        backtest(args.symbols[0], chart_path=args.chart)
@@ -1,8 +1,15 @@
 # Import necessary libraries
-import pandas as pd
-import matplotlib.pyplot as plt
 from binance.client import Client
 from datetime import datetime, timedelta
+import os
+import sys
+
+# Shared helpers live in the top-level common/ folder
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', '..', 'common'))
+from candle_store import CandleStore
+from charts import plot_price_chart
+from downloader import HistoryDownloader
+from indicator_bank import bank
 
 # Initialize Binance client (replace 'your_api_key' and 'your_api_secret' with your credentials)
 client = Client(api_key='your_api_key', api_secret='your_api_secret')
@@ -14,36 +21,25 @@ days = 365  # Last year
 end_date = datetime.now()
 start_date = end_date - timedelta(days=days)
 
-# Fetch historical data
-klines = client.get_historical_klines(symbol, interval, start_date.strftime("%d %b, %Y"), end_date.strftime("%d %b, %Y"))
-
-# Convert data into a DataFrame
-btc_df = pd.DataFrame(klines, columns=['timestamp', 'open', 'high', 'low', 'close', 'volume', 'close_time',
-                                       'quote_asset_volume', 'number_of_trades', 'taker_buy_base_asset_volume',
-                                       'taker_buy_quote_asset_volume', 'ignore'])
-
-# Keep only the necessary columns and convert data types
-btc_df = btc_df[['timestamp', 'close']]
-btc_df['timestamp'] = pd.to_datetime(btc_df['timestamp'], unit='ms')
-btc_df.set_index('timestamp', inplace=True)
-btc_df['close'] = btc_df['close'].astype(float)
-
-# Calculate moving averages: 50-day, 100-day, and 200-day
-btc_df['MA50'] = btc_df['close'].rolling(window=50).mean()
-btc_df['MA100'] = btc_df['close'].rolling(window=100).mean()
-btc_df['MA200'] = btc_df['close'].rolling(window=200).mean()
-
-# Plot the Close Price and Moving Averages
-plt.figure(figsize=(14, 7))
-plt.plot(btc_df['close'], label='Close Price', color='blue')
-plt.plot(btc_df['MA50'], label='50-day MA', color='orange', linestyle='--')
-plt.plot(btc_df['MA100'], label='100-day MA', color='green', linestyle='--')
-plt.plot(btc_df['MA200'], label='200-day MA', color='red', linestyle='--')
-
-# Enhancing the plot
-plt.title("BTC/USDT Close Price with 50, 100, and 200 Day Moving Averages (Last Year)")
-plt.xlabel("Date")
-plt.ylabel("Price (USDT)")
-plt.legend()
-plt.grid(visible=True, linestyle='--', alpha=0.5)
-plt.show()
+# Download any missing candles in the range into the local candle store (in parallel pages), then read them from it
+candle_store = CandleStore()
+start_ms = int(start_date.timestamp() * 1000)
+end_ms = int(end_date.timestamp() * 1000)
+HistoryDownloader(client, candle_store).download([symbol], interval, start_ms, end_ms)
+btc_df = candle_store.fetch_ohlcv(None, symbol, interval, start_ms=start_ms, end_ms=end_ms)
+
+# Keep only the necessary columns
+btc_df = btc_df[['close']]
+
+# Calculate moving averages: 50-day, 100-day, and 200-day, all in one pass through the indicator bank
+btc_df['MA50'], btc_df['MA100'], btc_df['MA200'] = bank.get(symbol, interval, btc_df, [50, 100, 200], kind='sma')
+
+# Plot the Close Price and Moving Averages, downsampled to the chart width. Pass a .png/.svg/.html
+# file name as the first argument to save the chart without a display instead of showing it
+plot_price_chart(btc_df.index, [
+    (btc_df['close'], {'label': 'Close Price', 'color': 'blue'}),
+    (btc_df['MA50'], {'label': '50-day MA', 'color': 'orange', 'linestyle': '--'}),
+    (btc_df['MA100'], {'label': '100-day MA', 'color': 'green', 'linestyle': '--'}),
+    (btc_df['MA200'], {'label': '200-day MA', 'color': 'red', 'linestyle': '--'}),
+], title="BTC/USDT Close Price with 50, 100, and 200 Day Moving Averages (Last Year)", figsize=(14, 7), grid=True,
+   path=sys.argv[1] if len(sys.argv) > 1 else None)
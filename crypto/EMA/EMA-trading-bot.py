@@ -1,9 +1,14 @@
 from binance.client import Client
-import pandas as pd
-import numpy as np
 import time
 import datetime
-import matplotlib.pyplot as plt
+import os
+import sys
+
+# Shared helpers live in the top-level common/ folder
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', '..', 'common'))
+from candle_store import CandleStore
+from charts import plot_price_chart
+from indicators import IncrementalEMA, feed_closed_candles
 
 # Set up Binance API (replace 'your_key' and 'your_secret' with actual API keys)
 api_key = 'api-key-here'
@@ -12,38 +17,21 @@ api_secret = 'secret-key-here'
 # Initialize Binance API with the provided credentials
 client = Client(api_key, api_secret)
 
+# Local candle store: each check only downloads the candles since the last one stored
+candle_store = CandleStore()
+
 # Function to fetch historical OHLCV data (candles)
 def fetch_ohlcv(symbol, interval='1h', limit=500):
-    # Fetch the historical candlestick data from Binance
-    candles = client.get_historical_klines(symbol, interval, limit=limit)
-    
-    # Convert the fetched data to a DataFrame
-    df = pd.DataFrame(candles, columns=['timestamp', 'open', 'high', 'low', 'close', 'volume', 'close_time', 'quote_asset_vol', 'number_of_trades', 'taker_buy_base_vol', 'taker_buy_quote_vol', 'ignore'])
-    
-    # Convert timestamp to a readable date format
-    df['timestamp'] = pd.to_datetime(df['timestamp'], unit='ms')
-    df.set_index('timestamp', inplace=True)
-    
-    # Convert prices to float for calculations
-    df['close'] = df['close'].astype(float)
-    return df
-
-# Function to calculate EMA
-def calculate_ema(df, period):
-    return df['close'].ewm(span=period, adjust=False).mean()
+    return candle_store.fetch_ohlcv(client, symbol, interval, limit=limit)
 
-# Function to plot the price data with EMAs
-def plot_ema_chart(df, short_ema, long_ema, symbol):
-    plt.figure(figsize=(14, 8))
-    plt.plot(df.index, df['close'], label='Close Price', color='blue')
-    plt.plot(df.index, short_ema, label='50-period EMA', color='green', linestyle='--')
-    plt.plot(df.index, mid_ema, label='100-period EMA', color='yellow', linestyle='--')
-    plt.plot(df.index, long_ema, label='200-period EMA', color='red', linestyle='--')
-    plt.title(f"{symbol} Price and EMAs")
-    plt.xlabel("Date")
-    plt.ylabel("Price (USDT)")
-    plt.legend()
-    plt.show()
+# Function to plot the price data with EMAs (downsampled to the chart width; path saves it without a display)
+def plot_ema_chart(df, short_ema, mid_ema, long_ema, symbol, path=None):
+    plot_price_chart(df.index, [
+        (df['close'], {'label': 'Close Price', 'color': 'blue'}),
+        (short_ema, {'label': '50-period EMA', 'color': 'green', 'linestyle': '--'}),
+        (mid_ema, {'label': '100-period EMA', 'color': 'yellow', 'linestyle': '--'}),
+        (long_ema, {'label': '200-period EMA', 'color': 'red', 'linestyle': '--'}),
+    ], title=f"{symbol} Price and EMAs", path=path)
 
 # Function to place a market buy order
 def place_buy_order(symbol, quantity):
@@ -57,28 +45,36 @@ def place_sell_order(symbol, quantity):
     order = client.order_market_sell(symbol=symbol, quantity=quantity)
     return order
 
+# Incremental EMAs per symbol, seeded once from history and updated per closed candle
+ema_states = {}
+
 # Function to check if we should buy/sell
 def trade(symbol):
     df = fetch_ohlcv(symbol)
     
-    # Calculate EMAs
-    short_ema = calculate_ema(df, 50)  # 50-period EMA (Short-term)
-    long_ema = calculate_ema(df, 200)  # 200-period EMA (Long-term)
-    mid_ema = calculate_ema(df,100) # 100-period EMA (mid-term)
+    # Update the EMAs with any newly closed candles instead of recalculating the whole frame
+    if symbol not in ema_states:
+        ema_states[symbol] = [IncrementalEMA(50), IncrementalEMA(100), IncrementalEMA(200)]  # Short, mid, long
+    short_ema, mid_ema, long_ema = ema_states[symbol]
+    forming_close = feed_closed_candles(ema_states[symbol], df)
     
-    # Get the latest values of short and long EMAs
-    last_short_ema = short_ema.iloc[-1]
-    last_long_ema = long_ema.iloc[-1]
-    prev_short_ema = short_ema.iloc[-2]
-    prev_long_ema = long_ema.iloc[-2]
-    last_mid_ema = mid_ema.iloc[-1]
-    prev_mid_ema = mid_ema.iloc[-2]
+    # Get the latest values of short and long EMAs (the latest includes the still-forming candle)
+    def latest(ema):
+        return ema.peek(forming_close) if forming_close is not None else ema.value
+    def previous(ema):
+        return ema.value if forming_close is not None else ema.previous
+    last_short_ema = latest(short_ema)
+    last_long_ema = latest(long_ema)
+    prev_short_ema = previous(short_ema)
+    prev_long_ema = previous(long_ema)
+    last_mid_ema = latest(mid_ema)
+    prev_mid_ema = previous(mid_ema)
     
     # Print the current EMA values regardless of buy/sell signal
     print(f"Checking {symbol} | Short EMA: {last_short_ema:.2f} | Mid EMA: {last_mid_ema:.2f} | Long EMA: {last_long_ema:.2f}")
 
     # Plot EMAs and price data
-    # plot_ema_chart(df, short_ema, long_ema, symbol)
+    # plot_ema_chart(df, *(df['close'].ewm(span=period, adjust=False).mean() for period in (50, 100, 200)), symbol)
     
     # Check if short EMA crosses above long EMA (Buy Signal)
     if last_short_ema > last_long_ema and prev_short_ema <= prev_long_ema:
@@ -1,37 +1,19 @@
-import yfinance as yf
 import pandas as pd
 from pytickersymbols import PyTickerSymbols
-import numpy as np
 import smtplib
 from email.mime.multipart import MIMEMultipart
 from email.mime.text import MIMEText
 from email.mime.base import MIMEBase
 from email import encoders
 from datetime import datetime
+import os
+import sys
+from price_panel import download_prices
+from panel_metrics import align_to_last_valid, calculate_rsi_panel, calculate_performance_panel, detect_signals
 
-# Function to calculate RSI
-def calculate_rsi(data, period=14):
-    delta = data['Close'].diff()
-    gain = delta.where(delta > 0, 0)
-    loss = -delta.where(delta < 0, 0)
-    avg_gain = gain.rolling(window=period, min_periods=1).mean()
-    avg_loss = loss.rolling(window=period, min_periods=1).mean()
-    rs = avg_gain / avg_loss
-    rsi = 100 - (100 / (1 + rs))
-    return rsi
-
-# Function to calculate Sharpe ratio
-def calculate_sharpe_ratio(data):
-    returns = data['Close'].pct_change().dropna()
-    sharpe_ratio = returns.mean() / returns.std() * np.sqrt(252)  # Annualized Sharpe ratio
-    return sharpe_ratio
-
-# Function to calculate Sortino ratio
-def calculate_sortino_ratio(data):
-    returns = data['Close'].pct_change().dropna()
-    downside_returns = returns[returns < 0]
-    sortino_ratio = returns.mean() / downside_returns.std() * np.sqrt(252)  # Annualized Sortino ratio
-    return sortino_ratio
+# Shared helpers live in the top-level common/ folder
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', '..', 'common'))
+from metrics import registry
 
 # Email sending function - Ensure to add your own email address and app password here to enable the script to authenticate and send an email
 def send_email(to_address, subject, body, attachment_path):
@@ -72,68 +54,33 @@ def send_email(to_address, subject, body, attachment_path):
     server.sendmail(from_address, to_address, text)
     server.quit()
 
+# RSI thresholds for the buy and sell signals
+BUY_THRESHOLD = 51
+SELL_THRESHOLD = 71
+
 # Get the list of stocks you want to include in the analysis. The below provides a static list but you can analyse the full S&P 500 by removing the array and inserting [stock['symbol'] for stock in sp500_symbols]
 stock_data = PyTickerSymbols()
 sp500_symbols = stock_data.get_stocks_by_index('S&P 500')
 symbols = ['TSLA', 'NVDA', 'AAPL', 'MSFT', 'MSTR', 'AMZN', 'META', 'INTC']
 
-# Create DataFrames to store the results
-buy_signal_results = pd.DataFrame(columns=['Ticker', 'RSI_Yesterday', 'RSI_Today'])
-sell_signal_results = pd.DataFrame(columns=['Ticker', 'RSI_Yesterday', 'RSI_Today'])
-
-# Loop through each stock and calculate the 14-day RSI
-for symbol in symbols:
-    data = yf.download(symbol, period='3mo')
-    data['RSI'] = calculate_rsi(data)
-    if len(data['RSI']) > 1:
-        rsi_yesterday = data['RSI'].iloc[-2]
-        rsi_today = data['RSI'].iloc[-1]
-
-# Now attach a buy or sell signal depending on the RSI calculations. You can adjust the thresholds to your preference.
-        if rsi_yesterday < 51 and rsi_today > 51:
-            buy_signal_results = pd.concat([buy_signal_results, pd.DataFrame({'Ticker': [symbol], 'RSI_Yesterday': [rsi_yesterday], 'RSI_Today': [rsi_today]})], ignore_index=True)
-        
-        if rsi_yesterday < 71 and rsi_today > 71:
-            sell_signal_results = pd.concat([sell_signal_results, pd.DataFrame({'Ticker': [symbol], 'RSI_Yesterday': [rsi_yesterday], 'RSI_Today': [rsi_today]})], ignore_index=True)
-
-# Add recent performance data and Sharpe/Sortino ratios
-performance_data = []
-
-for symbol in symbols:
-    data = yf.download(symbol, period='1y')
-    
-    if len(data) > 1:
-        # Calculate performance over different time periods
-        performance_1d = (data['Close'].iloc[-1] / data['Close'].iloc[-2] - 1) * 100 if len(data) > 1 else None
-        performance_7d = (data['Close'].iloc[-1] / data['Close'].iloc[-8] - 1) * 100 if len(data) > 7 else None
-        performance_14d = (data['Close'].iloc[-1] / data['Close'].iloc[-15] - 1) * 100 if len(data) > 14 else None
-        performance_1m = (data['Close'].iloc[-1] / data['Close'].iloc[-22] - 1) * 100 if len(data) > 22 else None
-        performance_3m = (data['Close'].iloc[-1] / data['Close'].iloc[-66] - 1) * 100 if len(data) > 66 else None
-        performance_6m = (data['Close'].iloc[-1] / data['Close'].iloc[-132] - 1) * 100 if len(data) > 132 else None
-        performance_1y = (data['Close'].iloc[-1] / data['Close'].iloc[0] - 1) * 100 if len(data) > 0 else None
-        
-        # Calculate Sharpe and Sortino ratios
-        sharpe_ratio = calculate_sharpe_ratio(data) if len(data) > 1 else None
-        sortino_ratio = calculate_sortino_ratio(data) if len(data) > 1 else None
-        
-        # Get the latest close price
-        latest_close_price = data['Close'].iloc[-1]
-        
-        performance_data.append({
-            'Ticker': symbol,
-            'Latest Close Price': latest_close_price,
-            '1D Performance': performance_1d,
-            '7D Performance': performance_7d,
-            '14D Performance': performance_14d,
-            '1M Performance': performance_1m,
-            '3M Performance': performance_3m,
-            '6M Performance': performance_6m,
-            '1Y Performance': performance_1y,
-            'Sharpe Ratio': sharpe_ratio,
-            'Sortino Ratio': sortino_ratio
-        })
-
-performance_df = pd.DataFrame(performance_data)
+# Download a year of close prices for every stock once (covers both the RSI and the performance steps)
+with registry.timer('download_prices'):
+    prices = download_prices(symbols, period='1y')
+
+# Calculate the 14-day RSI for every stock at once (each stock's prices aligned so the last row is its latest close)
+with registry.timer('calculate_rsi'):
+    rsi = calculate_rsi_panel(align_to_last_valid(prices))
+
+# Now attach a buy or sell signal depending on the RSI calculations: a signal fires when the RSI crosses above
+# the threshold between yesterday and today. You can adjust the thresholds to your preference.
+with registry.timer('detect_signals'):
+    signals = detect_signals(rsi, {'buy': BUY_THRESHOLD, 'sell': SELL_THRESHOLD})
+buy_signal_results = signals['buy']
+sell_signal_results = signals['sell']
+
+# Add recent performance data and Sharpe/Sortino ratios for every stock in one vectorized pass
+with registry.timer('calculate_performance'):
+    performance_df = calculate_performance_panel(prices)
 
 # Merge performance data with buy and sell signal results
 buy_signal_results = pd.merge(buy_signal_results, performance_df, on='Ticker', how='left')
@@ -163,7 +110,7 @@ send_email(
     body=f"""\
 Hi Benchod,
 
-Here are the latest signals from the RSI5171 strategy:
+Here are the latest signals from the RSI{BUY_THRESHOLD}{SELL_THRESHOLD} strategy:
 
 - Number of buy signals: {num_buy_signals}
 - Number of sell signals: {num_sell_signals}
@@ -175,3 +122,6 @@ Neil
 )
 
 print(f"Data saved to spreadsheet and email sent, last run on {current_datetime}")
+
+# Write the stage timings to $METRICS_FILE when it is set
+registry.write()
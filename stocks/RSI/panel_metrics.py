@@ -0,0 +1,101 @@
+import pandas as pd
+import numpy as np
+import os
+import sys
+
+# Shared analytics (Sharpe/Sortino, annualization) live in the repo-level common/ package
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', '..', 'common'))
+from analytics import bars_per_year, sharpe_ratio, sortino_ratio
+
+# Daily stock bars: 252 trading days a year
+DAILY_BARS_PER_YEAR = bars_per_year('1d', trading_days=252)
+
+# Performance look-backs: (column, row counted back from the latest close, minimum history needed)
+PERFORMANCE_HORIZONS = [
+    ('1D Performance', 2, 2),
+    ('7D Performance', 8, 8),
+    ('14D Performance', 15, 15),
+    ('1M Performance', 22, 23),
+    ('3M Performance', 66, 67),
+    ('6M Performance', 132, 133),
+]
+
+# Function to push each ticker's prices to the bottom of the panel, skipping missing days
+def align_to_last_valid(prices):
+    """
+    Returns a panel where every column holds that ticker's valid prices in order, ending
+    on the last row (missing days dropped, as .dropna() does per ticker). Row -k is then
+    each ticker's k-th latest close, so look-backs work across all tickers at once.
+    """
+    values = prices.to_numpy(dtype=np.float64)
+    order = np.argsort(~np.isnan(values), axis=0, kind='stable')  # NaNs first, valid prices keep their order
+    return pd.DataFrame(np.take_along_axis(values, order, axis=0), index=prices.index, columns=prices.columns)
+
+# Function to calculate RSI for every ticker in a dates x tickers panel
+def calculate_rsi_panel(prices, period=14):
+    delta = prices.diff()
+    # Same as calculate_rsi per ticker: the first day's change counts as 0, days without a price are skipped
+    gain = delta.where(delta > 0, 0).where(prices.notna())
+    loss = -delta.where(delta < 0, 0).where(prices.notna())
+    avg_gain = gain.rolling(window=period, min_periods=1).mean()
+    avg_loss = loss.rolling(window=period, min_periods=1).mean()
+    rs = avg_gain / avg_loss
+    rsi = 100 - (100 / (1 + rs))
+    return rsi
+
+# Function to calculate the annualized Sharpe ratio of every ticker
+def calculate_sharpe_ratio_panel(prices, periods_per_year=DAILY_BARS_PER_YEAR):
+    returns = prices.pct_change(fill_method=None).to_numpy()
+    return pd.Series(sharpe_ratio(returns, periods_per_year), index=prices.columns)
+
+# Function to calculate the annualized Sortino ratio of every ticker
+def calculate_sortino_ratio_panel(prices, periods_per_year=DAILY_BARS_PER_YEAR):
+    returns = prices.pct_change(fill_method=None).to_numpy()
+    return pd.Series(sortino_ratio(returns, periods_per_year), index=prices.columns)
+
+# Function to build the performance table for every ticker in one pass
+def calculate_performance_panel(prices):
+    aligned = align_to_last_valid(prices)
+    values = aligned.to_numpy()
+    history = np.sum(~np.isnan(values), axis=0)
+    latest = values[-1]
+
+    performance_df = pd.DataFrame({'Ticker': prices.columns, 'Latest Close Price': latest})
+    for column, rows_back, min_history in PERFORMANCE_HORIZONS:
+        if len(values) >= rows_back:
+            change = (latest / values[-rows_back] - 1) * 100
+        else:
+            change = np.full(len(latest), np.nan)
+        performance_df[column] = np.where(history >= min_history, change, np.nan)
+
+    # 1Y: against each ticker's first close in the panel
+    first = values[np.clip(len(values) - history, 0, len(values) - 1), np.arange(values.shape[1])]
+    performance_df['1Y Performance'] = (latest / first - 1) * 100
+
+    performance_df['Sharpe Ratio'] = calculate_sharpe_ratio_panel(aligned).to_numpy()
+    performance_df['Sortino Ratio'] = calculate_sortino_ratio_panel(aligned).to_numpy()
+
+    # Tickers need at least two closes, as before
+    return performance_df[history > 1].reset_index(drop=True)
+
+# Function to find the tickers whose RSI crossed above a threshold on the latest day
+def rsi_threshold_crossings(rsi, threshold):
+    rsi_yesterday = rsi.iloc[-2]
+    rsi_today = rsi.iloc[-1]
+    crossed = ((rsi_yesterday < threshold) & (rsi_today > threshold)).to_numpy()
+    return pd.DataFrame({
+        'Ticker': rsi.columns[crossed],
+        'RSI_Yesterday': rsi_yesterday.to_numpy()[crossed],
+        'RSI_Today': rsi_today.to_numpy()[crossed],
+    })
+
+# Function to build the signal tables for any number of thresholds from one RSI panel
+def detect_signals(rsi, thresholds):
+    """
+    thresholds: dict of signal name -> RSI level, e.g. {'buy': 51, 'sell': 71}. Several
+    rule sets can be evaluated from the same pass, e.g. {'buy': 51, 'sell': 71, 'buy_30': 30}.
+    Returns a dict of signal name -> DataFrame(Ticker, RSI_Yesterday, RSI_Today).
+    """
+    if len(rsi) < 2:
+        return {name: pd.DataFrame(columns=['Ticker', 'RSI_Yesterday', 'RSI_Today']) for name in thresholds}
+    return {name: rsi_threshold_crossings(rsi, threshold) for name, threshold in thresholds.items()}
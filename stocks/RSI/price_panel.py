@@ -0,0 +1,58 @@
+import yfinance as yf
+import pandas as pd
+import time
+
+# Function to download the close prices of one chunk of tickers in a single request
+def download_chunk(symbols, period='1y', threads=8):
+    # yfinance downloads the tickers of one call in parallel using `threads` threads
+    data = yf.download(symbols, period=period, group_by='column', progress=False, threads=threads)
+    if data.empty:
+        return pd.DataFrame()
+    if isinstance(data.columns, pd.MultiIndex):
+        closes = data['Close']
+    else:
+        closes = data[['Close']].rename(columns={'Close': symbols[0]})
+    # Tickers that failed to download come back as all-NaN columns
+    return closes.dropna(axis=1, how='all')
+
+# Function to download the close prices of every ticker into one wide panel (dates x tickers)
+def download_prices(symbols, period='1y', chunk_size=100, threads=8, retries=3, backoff=2.0):
+    """
+    Downloads the whole universe once, in chunks whose tickers are fetched in parallel
+    (chunks run one after another because yfinance shares state between concurrent
+    download calls). Tickers missing from a chunk's result (timeouts, rate limiting)
+    are retried in later rounds with an increasing pause; tickers still missing after
+    `retries` rounds are left out of the panel.
+    """
+    remaining = list(dict.fromkeys(symbols))
+    frames = []
+    for attempt in range(retries + 1):
+        if not remaining:
+            break
+        if attempt:
+            wait = backoff ** attempt
+            print(f"Retrying {len(remaining)} tickers in {wait:.0f}s")
+            time.sleep(wait)
+
+        chunks = [remaining[i:i + chunk_size] for i in range(0, len(remaining), chunk_size)]
+        results = [_safe_download(chunk, period, threads) for chunk in chunks]
+
+        for closes in results:
+            if not closes.empty:
+                frames.append(closes)
+        downloaded = {ticker for closes in results for ticker in closes.columns}
+        remaining = [symbol for symbol in remaining if symbol not in downloaded]
+
+    if remaining:
+        print(f"Could not download {len(remaining)} tickers: {', '.join(remaining)}")
+    if not frames:
+        return pd.DataFrame()
+    panel = pd.concat(frames, axis=1).sort_index()
+    return panel[[symbol for symbol in dict.fromkeys(symbols) if symbol in panel.columns]]
+
+def _safe_download(chunk, period, threads):
+    try:
+        return download_chunk(chunk, period, threads)
+    except Exception as e:
+        print(f"Error downloading {len(chunk)} tickers: {e}")
+        return pd.DataFrame()
@@ -0,0 +1,80 @@
+import pandas as pd
+import sqlite3
+import os
+
+# Signal tables, named like the sheets of the Excel report
+SIGNAL_TABLES = ['Buy_Signals', 'Sell_Signals']
+
+# Columns every signal table has (the performance columns are added by whoever appends the signals)
+SIGNAL_COLUMNS = ['Ticker', 'RSI_Yesterday', 'RSI_Today', 'DateTime']
+
+class SignalStore:
+    """
+    Append-only history of RSI signals in a SQLite file. Each run only writes its new
+    rows, lookups by ticker/date use an index, and the Excel workbook is generated on
+    demand (for the email attachment) instead of being the place the history lives.
+    """
+
+    def __init__(self, path='rsi_signals_master.db'):
+        self.path = path
+        self.connection = sqlite3.connect(path)
+
+    def close(self):
+        self.connection.close()
+
+    def table_exists(self, table):
+        cursor = self.connection.execute("SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = ?", (table,))
+        return cursor.fetchone() is not None
+
+    # Function to append new signals; only the new rows are written
+    def append(self, table, signals):
+        if signals.empty:
+            return 0
+        # Store timestamps in one sortable text format so date range queries can use the index
+        signals = signals.copy()
+        signals['DateTime'] = pd.to_datetime(signals['DateTime']).dt.strftime('%Y-%m-%d %H:%M:%S')
+        signals.to_sql(table, self.connection, if_exists='append', index=False)
+        self.connection.execute(
+            f'CREATE INDEX IF NOT EXISTS "idx_{table}_ticker_datetime" ON "{table}" ("Ticker", "DateTime")')
+        self.connection.execute(f'CREATE INDEX IF NOT EXISTS "idx_{table}_datetime" ON "{table}" ("DateTime")')
+        self.connection.commit()
+        return len(signals)
+
+    # Function to count the signals recorded so far
+    def count(self, table):
+        if not self.table_exists(table):
+            return 0
+        return self.connection.execute(f'SELECT COUNT(*) FROM "{table}"').fetchone()[0]
+
+    # Function to read signals, optionally for one ticker and/or a date range. A table with no signals yet
+    # still returns the signal columns, so the exported sheet keeps its header row
+    def query(self, table, ticker=None, start=None, end=None):
+        if not self.table_exists(table):
+            return pd.DataFrame(columns=SIGNAL_COLUMNS)
+        conditions, params = [], []
+        if ticker is not None:
+            conditions.append('"Ticker" = ?')
+            params.append(ticker)
+        if start is not None:
+            conditions.append('"DateTime" >= ?')
+            params.append(pd.Timestamp(start).strftime('%Y-%m-%d %H:%M:%S'))
+        if end is not None:
+            conditions.append('"DateTime" <= ?')
+            params.append(pd.Timestamp(end).strftime('%Y-%m-%d %H:%M:%S'))
+        where = f" WHERE {' AND '.join(conditions)}" if conditions else ''
+        return pd.read_sql_query(f'SELECT * FROM "{table}"{where}', self.connection, params=params,
+                                 parse_dates=['DateTime'])
+
+    # Function to load an existing Excel history (e.g. rsi_signals_master.xlsx) into an empty store
+    def import_excel(self, filename):
+        if not os.path.exists(filename) or any(self.count(table) for table in SIGNAL_TABLES):
+            return
+        for table in SIGNAL_TABLES:
+            self.append(table, pd.read_excel(filename, sheet_name=table))
+
+    # Function to write the full history to an Excel workbook, one sheet per signal table
+    def export_excel(self, filename):
+        with pd.ExcelWriter(filename) as writer:
+            for table in SIGNAL_TABLES:
+                self.query(table).to_excel(writer, sheet_name=table, index=False)
+        return filename